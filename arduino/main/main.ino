@@ -54,6 +54,10 @@ const unsigned long HOUR = 3600L * 1000L;
 unsigned long charge_start_time = 0;
 uint8_t current_charge_hour = 0;
 uint8_t charge_command[48];
+// last command received and its tag, sent back so that it is not sent again if unchanged
+uint8_t received_command[sizeof(charge_command)];
+char command_etag[64] = "";
+#define COMMAND_FORMAT_VERSION 2
 uint8_t charge_state = CHARGE_INACTIVE;
 uint8_t prev_charge_state = CHARGE_INACTIVE;
 
@@ -101,41 +105,86 @@ void setDefaultCommand() {
 }
 
 void readCommand() {
-  for(uint8_t i = 0; i < sizeof(charge_command); ++i)
-    charge_command[i] = 0;
-
-  uint32_t received_data_num = 0;
+  // the response is parsed line by line until the body, which is binary:
+  // format version, number of hours, end of validity (4 bytes, unused as
+  // there is no clock), duration of each bin in seconds (2 bytes), then one
+  // bit per hour, first hour first
+  bool status_line = true;
   bool body = false;
+  int status_code = 0;
 
-  char buf[4];
-  for(uint8_t i = 0; i < sizeof(buf); ++i) {
-    buf[i] = 0;
-  }
+  char line[80];
+  uint8_t line_length = 0;
+
+  char etag[sizeof(command_etag)];
+  etag[0] = 0;
+
+  uint8_t content[8 + sizeof(charge_command)/8];
+  uint8_t content_length = 0;
+
+  bool received = false;
 
   while (client.available()) {
     char c = client.read();
-    Serial.print(c);
+    received = true;
 
-    for(uint8_t i = 0; i < sizeof(buf)-1; ++i) {
-      buf[i] = buf[i+1];
+    if (body) {
+      if (content_length < sizeof(content)) {
+        content[content_length++] = c;
+      }
+      continue;
+    }
+
+    if (c == '\r') {
+      continue;
     }
-    buf[sizeof(buf)-1] = c;
 
-    if (!body) {
-      if (buf[0] == 13 && buf[1] == 10 && buf[2] == 13 && buf[3] == 10) {
-        body = true;
+    if (c != '\n') {
+      if (line_length < sizeof(line)-1) {
+        line[line_length++] = c;
       }
       continue;
     }
-    
-    charge_command[received_data_num] = c-'0';
 
-    received_data_num++;
-    if(received_data_num % sizeof(charge_command) == 0) { 
-      break;
+    line[line_length] = 0;
+
+    if (status_line) {
+      sscanf(line, "HTTP/%*s %d", &status_code);
+      status_line = false;
+    }
+    else if (line_length == 0) {
+      body = true;
+    }
+    else if (strncasecmp(line, "ETag: ", 6) == 0) {
+      strncpy(etag, line+6, sizeof(etag)-1);
+      etag[sizeof(etag)-1] = 0;
     }
+
+    line_length = 0;
   }
-  if (received_data_num>0) {
+
+  if (received) {
+    Serial.println(status_code);
+
+    // 304: the command has not changed since the last request,
+    // restore it in place of the default command
+    if (status_code == 304 && command_etag[0] != 0) {
+      memcpy(charge_command, received_command, sizeof(charge_command));
+    }
+    // commands must have one bin per hour
+    else if (status_code == 200 && content_length >= 8 && content[0] == COMMAND_FORMAT_VERSION
+        && ((uint16_t)content[6] << 8 | content[7]) == 3600) {
+      uint8_t n_hours = min(content[1], (uint8_t)sizeof(charge_command));
+
+      if (content_length >= 8 + (n_hours+7)/8) {
+        for(uint8_t i = 0; i < sizeof(charge_command); ++i) {
+          charge_command[i] = i < n_hours ? (content[8 + i/8] >> (7 - i%8)) & 1 : 0;
+        }
+        memcpy(received_command, charge_command, sizeof(charge_command));
+        strcpy(command_etag, etag);
+      }
+    }
+
     awaiting_http_response = false;
     update_lcd = true;
     return;
@@ -155,16 +204,21 @@ void httpQueryCommand() {
 
   if (client.connect(server, 80)) {
     Serial.println("connecting...");
-    char get[64];
+    char get[80];
     sprintf(
       get,
-      "GET /command/?time=%d&max_time=%d HTTP/1.1",
+      "GET /command/?time=%d&max_time=%d&resolution=3600 HTTP/1.1",
       config_charge_time,
       max(config_max_time,config_charge_time)
     );
     client.println(get);
     client.println("Host: 52.47.174.250");
     client.println("User-Agent: ArduinoWiFi/1.1");
+    client.println("Accept: application/octet-stream");
+    if (command_etag[0] != 0) {
+      client.print("If-None-Match: ");
+      client.println(command_etag);
+    }
     client.println("Connection: close");
     client.println();
     last_request = millis();
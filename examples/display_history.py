@@ -1,139 +1,68 @@
-from datetime import datetime, timedelta
-from itertools import product
-import pytz
-from optimizer.utils import str_to_datetime, datetime_to_str
+from optimizer.store import HistoryStore
 
 import numpy as np
 import pandas as pd
 
 from matplotlib import pyplot as plt
 
-production = pd.read_csv("output/production_history.csv")
-production["start_date"] = pd.to_datetime(
-    production["start_date"], format="%Y-%m-%dT%H:%M:%S%z", utc=True
-)
+import argparse
 
-production = production[
-    (production["start_date"] >= "2023-03-01")
-    & (production["start_date"] < "2024-03-01")
-]
-
-imports = pd.read_csv("output/imports_history.csv")
-imports = imports[
-    imports["receiver"].str.contains("France")
-    | imports["sender"].str.contains("France")
-]
-imports["import"] = imports["receiver"].str.contains("France")
-imports.loc[imports["import"] == False, "value"] = -imports.loc[
-    imports["import"] == False, "value"
-]
-imports["start_date"] = pd.to_datetime(
-    imports["start_date"], format="%Y-%m-%dT%H:%M:%S%z", utc=True
-)
-imports = imports[
-    (imports["start_date"] >= production["start_date"].min())
-    & (imports["start_date"] <= production["start_date"].max())
-]
-imports = imports.groupby(["start_date", "import"]).agg({"value": "sum"}).reset_index()
-imports.set_index("start_date", inplace=True)
+parser = argparse.ArgumentParser()
+parser.add_argument("--store", default="data/history")
+parser.add_argument("--start", default="2023-03-01")
+parser.add_argument("--end", default="2024-03-01")
+args = parser.parse_args()
 
-fig, ax = plt.subplots(
-    nrows=1, ncols=1, sharex=True, figsize=(7.5, 7.5)  # , height_ratios=[3, 1]
-)
+start = f"{args.start}T00:00:00+01:00"
+end = f"{args.end}T00:00:00+01:00"
 
-total_positive = None
-total_negative = None
+store = HistoryStore(args.store)
 
-imports.sort_values("import", inplace=True)
-for is_import, values in imports.groupby("import"):
-    positive = is_import
-    bottom = total_positive if positive else total_negative
-
-    values = (
-        values.resample("1H").agg({"value": "mean"})
-        # .resample("1d")
-        # .agg({"value": "sum"})
-    )
+# only the requested range is read from the memory-mapped arrays
+production = store.frame("production", start, end)
+imports = store.frame("imports", start, end)
 
-    if bottom is not None and len(bottom) != len(values):
-        continue
+exchanges = pd.DataFrame(
+    {
+        "imports": imports[
+            [key for key in imports.columns if key.endswith("_to_France")]
+        ].sum(axis=1),
+        "exports": -imports[
+            [key for key in imports.columns if key.startswith("France_to_")]
+        ].sum(axis=1),
+    }
+)
 
-    ax.bar(
-        values.index,
-        values["value"],
-        bottom=bottom,
-        label="imports" if is_import else "exports",
-        width=1.0/24.0,
+if "HYDRO_PUMPED_STORAGE" in production.columns:
+    production["HYDRO_PUMPED"] = production["HYDRO_PUMPED_STORAGE"].clip(upper=0)
+    production["HYDRO_PUMPED_STORAGE"] = production["HYDRO_PUMPED_STORAGE"].clip(
+        lower=0
     )
-    # ax.plot(
-    #     values.index,
-    #     values["value"]+(0 if bottom is None else bottom),
-    #     label="imports" if is_import else "exports",
-    # )
-    if bottom is None:
-        if positive:
-            total_positive = values["value"].values
-        else:
-            total_negative = values["value"].values
-    else:
-        if positive:
-            total_positive += values["value"].values
-        else:
-            total_negative += values["value"].values
-
-
-production.set_index("start_date", inplace=True)
-production.index = pd.to_datetime(production.index)
-production.loc[
-    (production["production_type"] == "HYDRO_PUMPED_STORAGE")
-    & (production["value"] < 0),
-    "production_type",
-] = "HYDRO_PUMPED"
-
-for production_type, values in production.groupby("production_type", sort=False):
-    if production_type == "TOTAL":
-        continue
-
-    positive = production_type != "HYDRO_PUMPED"
-    bottom = total_positive if positive else total_negative
 
-    if production_type == "HYDRO_PUMPED":
-        values = values.reindex(
-            production[production["production_type"] == "TOTAL"].index
-        ).fillna(0)
+production = production.drop(columns=["TOTAL"], errors="ignore")
+series = pd.concat([exchanges, production], axis=1).fillna(0)
 
-    values = (
-        values.resample("1H").agg({"value": "mean"})
-        # .resample("1d")
-        # .agg({"value": "sum"})
-    )
+fig, ax = plt.subplots(
+    nrows=1, ncols=1, sharex=True, figsize=(7.5, 7.5)  # , height_ratios=[3, 1]
+)
 
-    if bottom is not None and len(bottom) != len(values):
-        continue
+total_positive = np.zeros(len(series))
+total_negative = np.zeros(len(series))
+
+for label in series.columns:
+    values = series[label].values
+    positive = label not in ["exports", "HYDRO_PUMPED"]
+    bottom = total_positive if positive else total_negative
 
     ax.bar(
-        values.index,
-        values["value"],
-        bottom=bottom,
-        label=production_type,
-        width=1.0/24.0,
+        series.index,
+        values,
+        bottom=bottom.copy(),
+        label=label,
+        width=1.0 / 24.0,
     )
-    # ax.plot(
-    #     values.index,
-    #     values["value"]+(0 if bottom is None else bottom),
-    #     label=production_type,
-    # )
-    if bottom is None:
-        if positive:
-            total_positive = values["value"].values
-        else:
-            total_negative = values["value"].values
-    else:
-        if positive:
-            total_positive += values["value"].values
-        else:
-            total_negative += values["value"].values
 
+    bottom += values
 
 fig.legend()
 plt.show()
@@ -0,0 +1,58 @@
+"""measure the time it takes to import a module in a fresh interpreter
+
+Example: python examples/import_time.py server.api --runs 5
+"""
+
+import argparse
+import subprocess
+import sys
+
+import numpy as np
+
+HEAVY_MODULES = ["cvxpy", "pandas", "scipy", "matplotlib"]
+
+parser = argparse.ArgumentParser()
+parser.add_argument("module", nargs="?", default="server.api")
+parser.add_argument("--runs", type=int, default=5)
+parser.add_argument("--top", type=int, default=10)
+args = parser.parse_args()
+
+code = f"""
+import sys, time
+t = time.perf_counter()
+import {args.module}
+print(time.perf_counter() - t)
+print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))
+"""
+
+durations = []
+for run in range(args.runs):
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    duration, loaded = res.stdout.split("\n")[:2]
+    durations.append(float(duration))
+
+# cumulative import time of each module (in microseconds), from the last run
+cumulative = {}
+for line in res.stderr.splitlines():
+    fields = line.split("|")
+    if len(fields) != 3 or not fields[1].strip().isdigit():
+        continue
+
+    cumulative[fields[2].strip()] = int(fields[1])
+
+print(
+    f"import {args.module}: {np.median(durations) * 1000:.0f} ms (median of {args.runs} runs)"
+)
+print(f"heavy modules loaded: {loaded or 'none'}")
+print("slowest top-level imports:")
+
+top_level = {
+    module.strip(): t for module, t in cumulative.items() if "." not in module.strip()
+}
+for module, t in sorted(top_level.items(), key=lambda item: -item[1])[: args.top]:
+    print(f"  {module:<30} {t / 1000:8.1f} ms")
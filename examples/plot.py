@@ -13,6 +13,9 @@ import argparse
 parser = argparse.ArgumentParser()
 parser.add_argument("--start", default=None)
 parser.add_argument("--end", default=None)
+parser.add_argument(
+    "--resolution", type=int, default=3600, help="bin duration in seconds, at most 3600"
+)
 args = parser.parse_args()
 
 if args.start is None:
@@ -26,42 +29,39 @@ else:
     start = f"{args.start}T00:00:00+01:00"
     end = f"{args.end}T00:00:00+01:00"
 
-optimizer = Optimizer()
-production = optimizer.prediction.dispatch(start, end)
-carbon_intensity = np.array([source.carbon_intensity for source in optimizer.sources])
+optimizer = Optimizer(resolution=args.resolution)
+forecast = optimizer.forecast(start, end)
+production = optimizer.prediction.dispatch(forecast=forecast)
 
-t = np.arange(production.shape[1])
+t = np.arange(forecast.n_bins)
 hours = [
-    (str_to_datetime(start).replace(tzinfo=None) + timedelta(hours=int(h))).strftime(
-        "%H:%M"
-    )
-    for h in np.arange(production.shape[1])
+    (
+        str_to_datetime(start).replace(tzinfo=None)
+        + timedelta(seconds=int(h) * forecast.resolution)
+    ).strftime("%H:%M")
+    for h in t
 ]
 
-total = np.zeros(production.shape[1])
+total = np.zeros(forecast.n_bins)
 
 fig, axes = plt.subplots(
     nrows=2, ncols=1, sharex=True, figsize=(7.5, 7.5), height_ratios=[3, 1]
 )
 
-n = 0
-for source in optimizer.sources:
-    color = source.color
+for n, source in enumerate(optimizer.sources):
     axes[0].bar(
         t,
         production[n],
         bottom=total,
-        color=color,
-        label=source.__class__.__name__,
+        color=source.color,
+        label=forecast.sources[n],
         width=1.0,
     )
     total += production[n]
-    n += 1
 
 axes[0].set_ylabel("MWh")
 
-ci = carbon_intensity @ production
-ci /= production.sum(axis=0)
+ci = forecast.mix_carbon_intensity(production)
 
 ax2 = axes[0].twinx()  # instantiate a second axes that shares the same x-axis
 
@@ -72,12 +72,14 @@ ax2.tick_params(axis="y", labelcolor="black")
 ref_emissions = None
 styles = ["dotted", "dashed", "-"]
 
+# charge times are in hours
+bins_per_hour = 3600 // forecast.resolution
+
 for i, max_time in enumerate([12, 24, 48]):
     command = optimizer.optimize(
-        min_time=12,
-        max_time=max_time,
-        start=start,
-        end=end,
+        min_time=12 * bins_per_hour,
+        max_time=max_time * bins_per_hour,
+        carbon_intensity=ci,
     )
     emissions = np.dot(ci, command)
 
@@ -95,8 +97,8 @@ for i, max_time in enumerate([12, 24, 48]):
     )
 
 axes[1].set_ylabel("Optimal command")
-axes[1].set_xticks(t[::4])
-axes[1].set_xticklabels([hours[i] for i in t[::4]], rotation=90)
+axes[1].set_xticks(t[:: 4 * bins_per_hour])
+axes[1].set_xticklabels([hours[i] for i in t[:: 4 * bins_per_hour]], rotation=90)
 
 fig.legend(bbox_to_anchor=(0.98, 0.9), loc="upper left")
 plt.subplots_adjust(wspace=0, hspace=0)
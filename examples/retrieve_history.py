@@ -1,4 +1,5 @@
 from optimizer.history import History
+from optimizer.store import HistoryStore
 
 from datetime import datetime, timedelta
 import pytz
@@ -17,6 +18,12 @@ parser.add_argument("--production", action="store_true", default=False)
 parser.add_argument("--consumption", action="store_true", default=False)
 parser.add_argument("--imports", action="store_true", default=False)
 parser.add_argument("--unavailabilities", action="store_true", default=False)
+parser.add_argument("--workers", type=int, default=4)
+parser.add_argument(
+    "--store",
+    default=None,
+    help="incrementally sync hourly arrays into this history store instead of writing csv files",
+)
 args = parser.parse_args()
 
 if args.start is None:
@@ -30,20 +37,35 @@ else:
     start = f"{args.start}T00:00:00+01:00"
     end = f"{args.end}T00:00:00+01:00"
 
-hist = History()
+hist = History(max_workers=args.workers)
 
-if args.production:
-    production = hist.retrieve_production(start, end)
-    production.to_csv("data/production_history.csv")
+if args.store:
+    # only the ranges missing from the store are retrieved
+    store = HistoryStore(args.store)
+    datasets = {
+        "production": args.production,
+        "consumption": args.consumption,
+        "imports": args.imports,
+        "unavailability": args.unavailabilities,
+    }
 
-if args.consumption:
-    consumption = hist.retrieve_consumption(start, end)
-    consumption.to_csv("data/consumption_history.csv")
+    for dataset, selected in datasets.items():
+        if selected:
+            gaps = hist.sync(store, dataset, start, end)
+            print(f"{dataset}: retrieved {len(gaps)} missing ranges")
+else:
+    if args.production:
+        production = hist.retrieve_production(start, end)
+        production.to_csv("data/production_history.csv")
+
+    if args.consumption:
+        consumption = hist.retrieve_consumption(start, end)
+        consumption.to_csv("data/consumption_history.csv")
 
-if args.imports:
-    imports = hist.retrieve_imports(start, end)
-    imports.to_csv("data/imports_history.csv")
+    if args.imports:
+        imports = hist.retrieve_imports(start, end)
+        imports.to_csv("data/imports_history.csv")
 
-if args.unavailabilities:
-    unavailability = hist.retrieve_unavailability(start, end)
-    unavailability.to_csv("data/unavailability_history.csv")
+    if args.unavailabilities:
+        unavailability = hist.retrieve_unavailability(start, end)
+        unavailability.to_csv("data/unavailability_history.csv")
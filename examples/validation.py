@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
 
+from optimizer.backtest import backtest
 from optimizer.optimization import Optimizer
 from optimizer.utils import datetime_to_str
 
@@ -10,18 +11,6 @@ from glob import glob
 from os.path import join as opj
 
 
-def retrieve_ranges(df, length):
-    carbon_intensity = df["carbonIntensity"].values
-
-    i = 0
-    while i < len(carbon_intensity) - length:
-        if np.all(~np.isnan(carbon_intensity[i : i + length])):
-            yield df[i : i + length]
-            i += length
-        else:
-            i += 1
-
-
 carbon_intensity = pd.concat(
     [pd.read_csv(f) for f in glob("data/carbon-history/*.csv")]
 )
@@ -44,35 +33,29 @@ idx = pd.date_range(
 
 carbon_intensity = carbon_intensity.reindex(idx, fill_value=np.nan)
 
-CHARGE_TIME = 1
+CHARGE_TIMES = [1]
 MAX_TIMES = [12, 24, 30, 36, 48]
+HORIZON = 48
 
-for max_time in MAX_TIMES:
-    ranges = retrieve_ranges(carbon_intensity, max_time)
-    total_gains = 0
-    total_optimum_gains = 0
-
-    for range in ranges:
-        start = datetime_to_str(range.index.min())
-        end = datetime_to_str(range.index.min() + timedelta(days=2))
-        ci = np.append(range["carbonIntensity"], [0] * (48 - max_time))
+actual = carbon_intensity["carbonIntensity"].values
 
-        baseline_command = np.zeros(48)
-        baseline_command[:CHARGE_TIME] = 1
-        baseline_emissions = np.dot(ci, baseline_command)
+# the model forecast is computed for non-overlapping windows only,
+# other windows are skipped by the backtest
+stride = min(MAX_TIMES)
+forecasts = np.full((len(actual), HORIZON), np.nan)
 
-        optimum = Optimizer()
-        optimum_command = optimum.optimize(CHARGE_TIME, max_time, start, end, ci)
-        optimum_emissions = np.dot(ci, optimum_command)
+optimizer = Optimizer()
 
-        model_optimum = Optimizer()
-        model_command = model_optimum.optimize(CHARGE_TIME, max_time, start, end)
-        model_emissions = np.dot(ci, model_command)
+for i in np.arange(0, len(actual) - stride + 1, stride):
+    if np.any(np.isnan(actual[i : i + stride])):
+        continue
 
-        print(baseline_emissions - model_emissions)
-        print(baseline_emissions - optimum_emissions)
+    start = carbon_intensity.index[i]
+    forecasts[i] = optimizer.predict_carbon_intensity(
+        datetime_to_str(start), datetime_to_str(start + timedelta(hours=HORIZON))
+    )
 
-        total_gains += baseline_emissions - model_emissions
-        total_optimum_gains += baseline_emissions - optimum_emissions
+results = backtest(actual, MAX_TIMES, CHARGE_TIMES, forecasts=forecasts, stride=stride)
 
-    print(max_time, total_gains / total_optimum_gains)
+for result in results:
+    print(result["max_time"], result["charge_time"], result["ratio"])
@@ -0,0 +1,86 @@
+import numpy as np
+
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def backtest(
+    carbon_intensity,
+    max_times: list,
+    charge_times: list,
+    forecasts=None,
+    stride: int = 1,
+) -> list:
+    """evaluate charge scheduling over every window of a carbon intensity history
+
+    For each window, charging immediately (baseline) is compared to charging
+    during the cheapest bins of the actual carbon intensity (optimum) and,
+    if forecasts are given, during the cheapest bins of the forecast (model).
+    All windows and charge times of a given max time are evaluated at once.
+
+    :param carbon_intensity: actual carbon intensity of each bin, NaN if unknown
+    :type carbon_intensity: np.ndarray
+    :param max_times: amounts of bins within which charging must happen
+    :type max_times: list
+    :param charge_times: amounts of bins to charge in
+    :type charge_times: list
+    :param forecasts: carbon intensity forecast made at each bin (one row per bin, at least max(max_times) columns), NaN if unavailable, defaults to None
+    :type forecasts: np.ndarray, optional
+    :param stride: amount of bins between consecutive windows, defaults to 1
+    :type stride: int, optional
+    :return: emissions saved by the model and by the optimum, and their ratio, for each max time and charge time
+    :rtype: list
+    """
+    carbon_intensity = np.asarray(carbon_intensity, dtype=float)
+
+    if forecasts is not None:
+        forecasts = np.asarray(forecasts, dtype=float)
+
+    results = []
+
+    for max_time in max_times:
+        if max_time > len(carbon_intensity):
+            continue
+
+        actual = sliding_window_view(carbon_intensity, max_time)[::stride]
+        valid = ~np.any(np.isnan(actual), axis=1)
+
+        if forecasts is not None:
+            forecast = forecasts[: len(carbon_intensity) - max_time + 1, :max_time]
+            forecast = forecast[::stride]
+            valid &= ~np.any(np.isnan(forecast), axis=1)
+            forecast = forecast[valid]
+
+        actual = actual[valid]
+
+        # emissions when charging during the first k bins, the k cheapest bins,
+        # and the k bins forecast to be the cheapest, for every k at once
+        baseline = np.cumsum(actual, axis=1)
+        optimum = np.cumsum(np.sort(actual, axis=1), axis=1)
+
+        if forecasts is not None:
+            order = np.argsort(forecast, axis=1, kind="stable")
+            model = np.cumsum(np.take_along_axis(actual, order, axis=1), axis=1)
+
+        for charge_time in charge_times:
+            if charge_time < 1 or charge_time > max_time:
+                continue
+
+            optimum_gains = np.sum(
+                baseline[:, charge_time - 1] - optimum[:, charge_time - 1]
+            )
+
+            result = {
+                "max_time": max_time,
+                "charge_time": charge_time,
+                "windows": len(actual),
+                "optimum_gains": optimum_gains,
+            }
+
+            if forecasts is not None:
+                gains = np.sum(baseline[:, charge_time - 1] - model[:, charge_time - 1])
+                result["gains"] = gains
+                result["ratio"] = gains / optimum_gains if optimum_gains > 0 else np.nan
+
+            results.append(result)
+
+    return results
@@ -0,0 +1,411 @@
+import argparse
+import hashlib
+import json
+import pickle
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from glob import glob
+from os import getenv, makedirs, remove
+from os.path import join as opj
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+
+class CachedResponse:
+    """decoded response, exposing the part of requests.Response used by the API clients"""
+
+    def __init__(self, status_code: int, data):
+        self.status_code = status_code
+        self.data = data
+        self.headers = {}
+
+    def json(self):
+        return self.data
+
+    @property
+    def content(self):
+        return json.dumps(self.data).encode("utf-8")
+
+
+class ResponseCache:
+    """store of decoded API responses
+
+    Payloads are pickled into a single sqlite database, which also indexes
+    their expiration, size and last access. The most recently used payloads
+    are kept in memory, so that repeated hits neither read the database nor
+    decode anything.
+
+    Expired entries are evicted, then the least recently used ones until
+    the database fits within ``max_bytes``, every ``evict_interval`` writes
+    or as soon as the cache may exceed its budget. Access times are only
+    written to the database before evicting, so that hits never write.
+
+    Writes are atomic sqlite transactions, so concurrent workers never see
+    partial entries, and :meth:`lock` lets a single worker refresh a key
+    at a time while the others may serve the expired payload. Expired
+    entries are therefore only evicted after ``stale_ttl`` seconds.
+    """
+
+    lock_stripes = 1024
+    # amount of writes between evictions, unless the cache may exceed its budget
+    evict_interval = 64
+
+    def __init__(
+        self,
+        path: str = ".cache",
+        memory_size: int = 16,
+        max_bytes: int = None,
+        stale_ttl: float = 86400,
+    ):
+        self.path = path
+        self.memory_size = memory_size
+        self.stale_ttl = stale_ttl
+
+        if max_bytes is None:
+            max_bytes = int(getenv("CACHE_MAX_BYTES", 1024**3))
+        self.max_bytes = max_bytes
+
+        self.memory = OrderedDict()
+        self.accessed = {}
+        self.mutex = threading.Lock()
+        self.local = threading.local()
+
+        self.key_locks = {}
+        self.lock_file = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # estimated size of the database and writes since the last eviction
+        self.estimated_size = None
+        self.writes = 0
+
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self.local, "connection", None)
+
+        if connection is None:
+            makedirs(self.path, exist_ok=True)
+            connection = sqlite3.connect(opj(self.path, "cache.sqlite"), timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, expires REAL, size INTEGER, accessed REAL, payload BLOB)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)"
+            )
+
+            # databases created before write times were recorded
+            columns = [
+                row[1] for row in connection.execute("PRAGMA table_info(entries)")
+            ]
+            if "written" not in columns:
+                with connection:
+                    connection.execute("ALTER TABLE entries ADD COLUMN written REAL")
+
+            self.local.connection = connection
+
+        return connection
+
+    def remember(self, key, expires, data):
+        with self.mutex:
+            self.memory[key] = (expires, data)
+            self.memory.move_to_end(key)
+
+            while len(self.memory) > self.memory_size:
+                self.memory.popitem(last=False)
+
+    def get(self, key, stale: bool = False, remember: bool = True):
+        """retrieve a payload
+
+        :param key: entry key
+        :type key: str
+        :param stale: whether to return the payload even if it has expired, defaults to False
+        :type stale: bool, optional
+        :param remember: whether to keep the payload in memory, defaults to True
+        :type remember: bool, optional
+        :return: the payload, or None if it is missing, expired or unreadable
+        """
+        now = time.time()
+
+        with self.mutex:
+            if key in self.memory:
+                expires, data = self.memory[key]
+
+                if stale or expires is None or now <= expires:
+                    self.memory.move_to_end(key)
+                    self.accessed[key] = now
+                    self.hits += 1
+                    return data
+
+                del self.memory[key]
+
+        connection = self.connection()
+
+        try:
+            row = connection.execute(
+                "SELECT expires, payload FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.DatabaseError:
+            row = None
+
+        if row is None or (not stale and row[0] is not None and now > row[0]):
+            self.misses += 1
+            return None
+
+        expires, payload = row
+
+        try:
+            data = pickle.loads(payload)
+        except Exception:
+            # drop corrupted entries, they will be fetched again
+            self.delete(key)
+            self.misses += 1
+            return None
+
+        # access times are written in batches when evicting, hits stay read-only
+        with self.mutex:
+            self.accessed[key] = now
+
+        if remember and (not stale or expires is None or now <= expires):
+            self.remember(key, expires, data)
+
+        self.hits += 1
+        return data
+
+    def written(self, key):
+        """time at which an entry was last written
+
+        :param key: entry key
+        :type key: str
+        :return: time in seconds since epoch, or None if the entry is missing
+        :rtype: float
+        """
+        try:
+            row = (
+                self.connection()
+                .execute("SELECT written FROM entries WHERE key = ?", (key,))
+                .fetchone()
+            )
+        except sqlite3.DatabaseError:
+            row = None
+
+        return None if row is None else row[0]
+
+    def delete(self, key):
+        connection = self.connection()
+        with connection:
+            connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+        with self.mutex:
+            self.memory.pop(key, None)
+
+    @contextmanager
+    def lock(self, key, blocking: bool = True):
+        """hold the lock of a key, across threads and processes
+
+        Keys are spread over a fixed amount of byte-range locks of a single
+        lock file, so unrelated keys may occasionally share a lock.
+
+        :param key: entry key
+        :type key: str
+        :param blocking: whether to wait for the lock, defaults to True
+        :type blocking: bool, optional
+        :return: whether the lock was acquired
+        :rtype: bool
+        """
+        stripe = int(hashlib.md5(key.encode("utf-8")).hexdigest()[:8], 16) % self.lock_stripes
+
+        with self.mutex:
+            thread_lock = self.key_locks.setdefault(stripe, threading.Lock())
+
+        if not thread_lock.acquire(blocking):
+            yield False
+            return
+
+        try:
+            if fcntl is None:
+                yield True
+                return
+
+            lock_file = self.open_lock_file()
+
+            try:
+                fcntl.lockf(
+                    lock_file,
+                    fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB,
+                    1,
+                    stripe,
+                )
+            except OSError:
+                yield False
+                return
+
+            try:
+                yield True
+            finally:
+                fcntl.lockf(lock_file, fcntl.LOCK_UN, 1, stripe)
+        finally:
+            thread_lock.release()
+
+    def open_lock_file(self):
+        # kept open: closing any descriptor of the file would release all of the process locks
+        with self.mutex:
+            if self.lock_file is None:
+                makedirs(self.path, exist_ok=True)
+                self.lock_file = open(opj(self.path, "cache.lock"), "a+")
+
+            return self.lock_file
+
+    def set(self, key, data, expires: float = None, remember: bool = True):
+        payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+
+        connection = self.connection()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO entries (key, expires, size, accessed, written, payload) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, expires, len(payload), now, now, payload),
+            )
+
+        if remember:
+            self.remember(key, expires, data)
+        else:
+            # drop any previous payload kept in memory
+            with self.mutex:
+                self.memory.pop(key, None)
+
+        # the size is only summed again when evicting, other workers write too
+        with self.mutex:
+            self.writes += 1
+            if self.estimated_size is not None:
+                self.estimated_size += len(payload)
+
+            due = (
+                self.estimated_size is None
+                or self.estimated_size > self.max_bytes
+                or self.writes >= self.evict_interval
+            )
+
+        if due:
+            self.evict()
+
+    def size(self) -> int:
+        return (
+            self.connection()
+            .execute("SELECT COALESCE(SUM(size), 0) FROM entries")
+            .fetchone()[0]
+        )
+
+    def evict(self, max_bytes: int = None) -> int:
+        """evict long expired entries, then least recently used ones until the cache fits in max_bytes
+
+        :param max_bytes: size budget, defaults to None (the cache budget)
+        :type max_bytes: int, optional
+        :return: amount of evicted entries
+        :rtype: int
+        """
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+
+        connection = self.connection()
+
+        with self.mutex:
+            accessed = [(t, key) for key, t in self.accessed.items()]
+            self.accessed = {}
+
+        with connection:
+            connection.executemany(
+                "UPDATE entries SET accessed = ? WHERE key = ?", accessed
+            )
+
+            evicted = connection.execute(
+                "DELETE FROM entries WHERE expires IS NOT NULL AND expires < ?",
+                (time.time() - self.stale_ttl,),
+            ).rowcount
+
+            size = self.size()
+            excess = size - max_bytes
+            keys = []
+
+            if excess > 0:
+                for key, entry_size in connection.execute(
+                    "SELECT key, size FROM entries ORDER BY accessed"
+                ):
+                    if excess <= 0:
+                        break
+
+                    keys.append((key,))
+                    excess -= entry_size
+                    size -= entry_size
+
+                connection.executemany("DELETE FROM entries WHERE key = ?", keys)
+
+        with self.mutex:
+            for (key,) in keys:
+                self.memory.pop(key, None)
+
+            self.estimated_size = size
+            self.writes = 0
+
+        self.evictions += evicted + len(keys)
+        return evicted + len(keys)
+
+    def clear(self):
+        connection = self.connection()
+        with connection:
+            connection.execute("DELETE FROM entries")
+
+        with self.mutex:
+            self.memory.clear()
+            self.estimated_size = 0
+
+    def stats(self) -> dict:
+        entries = self.connection().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+        return {
+            "entries": entries,
+            "bytes": self.size(),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def cleanup(path: str = ".cache"):
+    """remove files left by the former pickled responses cache"""
+    files = glob(opj(path, "*.pickle")) + glob(opj(path, "*.expires"))
+
+    for f in files:
+        remove(f)
+
+    return len(files)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="manage the API responses cache")
+    parser.add_argument("--path", default=".cache")
+    parser.add_argument("--max-bytes", type=int, default=None)
+    parser.add_argument("--cleanup", action="store_true", default=False)
+    parser.add_argument("--clear", action="store_true", default=False)
+    args = parser.parse_args()
+
+    cache = ResponseCache(args.path, max_bytes=args.max_bytes)
+
+    if args.clear:
+        cache.clear()
+
+    if args.cleanup:
+        print(f"evicted {cache.evict()} entries")
+        print(f"removed {cleanup(args.path)} legacy files")
+
+    for stat, value in cache.stats().items():
+        print(f"{stat}: {value}")
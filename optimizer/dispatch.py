@@ -0,0 +1,101 @@
+import threading
+
+import numpy as np
+
+
+def merit_order_dispatch(availability, consumption, marginal_cost):
+    """dispatch sources by ascending marginal cost, for all bins at once
+
+    Bins are independent and the cost is linear, so this is the solution of
+    the dispatch linear program. Sources with equal marginal costs are
+    dispatched in their original order. If availability cannot meet
+    consumption, every source produces at full availability.
+
+    :param availability: availability of each source for each bin
+    :type availability: np.ndarray
+    :param consumption: consumption for each bin
+    :type consumption: np.ndarray
+    :param marginal_cost: marginal cost of each source
+    :type marginal_cost: np.ndarray
+    :return: production of each source for each bin
+    :rtype: np.ndarray
+    """
+    availability = np.maximum(np.asarray(availability, dtype=float), 0)
+    consumption = np.asarray(consumption, dtype=float)
+
+    order = np.argsort(marginal_cost, kind="stable")
+
+    # capacity of the cheaper sources, for each source in merit order
+    cheaper = np.cumsum(availability[order], axis=0) - availability[order]
+
+    production = np.empty_like(availability)
+    production[order] = np.clip(
+        consumption[np.newaxis, :] - cheaper, 0, availability[order]
+    )
+
+    return production
+
+
+class LPDispatcher:
+    """dispatch linear program for a given amount of sources and bins
+
+    Unlike :func:`merit_order_dispatch`, it can accommodate constraints
+    coupling bins (e.g. storage or ramping).
+
+    The problem is built once with parameters for availability, consumption
+    and marginal cost, so that subsequent solves skip canonicalization and
+    are warm-started from the previous solution. cvxpy is only imported
+    when the first problem is built.
+    """
+
+    def __init__(self, n_sources: int, n_bins: int):
+        import cvxpy as cp
+
+        self.availability = cp.Parameter((n_sources, n_bins))
+        self.consumption = cp.Parameter(n_bins)
+        self.marginal_cost = cp.Parameter(n_sources)
+
+        self.x = cp.Variable((n_sources, n_bins))
+
+        constraints = [
+            self.x >= 0,  # production must be positive
+            self.x
+            <= self.availability,  # production from each source cannot exceed availability at any time
+            cp.sum(self.x, axis=0)
+            >= self.consumption,  # total production must meet demand at any time
+        ]
+
+        self.problem = cp.Problem(
+            cp.Minimize(cp.sum(self.marginal_cost @ self.x)),
+            constraints,
+        )
+
+        self.lock = threading.Lock()
+
+    def solve(self, availability, consumption, marginal_cost):
+        with self.lock:
+            self.availability.value = np.asarray(availability, dtype=float)
+            self.consumption.value = np.asarray(consumption, dtype=float)
+            self.marginal_cost.value = np.asarray(marginal_cost, dtype=float)
+
+            self.problem.solve(warm_start=True)
+
+            if self.x.value is None:
+                return None
+
+            return self.x.value.copy()
+
+
+_dispatchers = {}
+_dispatchers_lock = threading.Lock()
+
+
+def lp_dispatcher(n_sources: int, n_bins: int) -> LPDispatcher:
+    """retrieve the dispatch problem for a given shape, building it if needed"""
+    with _dispatchers_lock:
+        key = (n_sources, n_bins)
+
+        if key not in _dispatchers:
+            _dispatchers[key] = LPDispatcher(n_sources, n_bins)
+
+        return _dispatchers[key]
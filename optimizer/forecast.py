@@ -0,0 +1,103 @@
+from datetime import timedelta
+
+import numpy as np
+
+
+class ForecastBundle:
+    """availability of every source and consumption over a time window
+
+    Availability is a single read-only, C-contiguous (sources, bins) array,
+    built once and shared by dispatch, carbon intensity prediction and
+    plotting, along with the properties of each source.
+    """
+
+    def __init__(
+        self,
+        start,
+        availability,
+        consumption,
+        sources: list,
+        marginal_cost,
+        carbon_intensity,
+        resolution: int = 3600,
+    ):
+        """
+        :param start: time of the first bin
+        :type start: datetime
+        :param availability: availability of each source for each bin
+        :type availability: np.ndarray
+        :param consumption: consumption for each bin
+        :type consumption: np.ndarray
+        :param sources: name of each source
+        :type sources: list
+        :param marginal_cost: marginal cost of each source
+        :type marginal_cost: np.ndarray
+        :param carbon_intensity: carbon intensity of each source
+        :type carbon_intensity: np.ndarray
+        :param resolution: duration of each bin in seconds, defaults to 3600
+        :type resolution: int, optional
+        """
+        self.start = start
+        self.resolution = resolution
+        self.sources = tuple(sources)
+
+        self.availability = self.freeze(availability, (len(self.sources), None))
+        n_bins = self.availability.shape[1]
+
+        self.consumption = self.freeze(consumption, (n_bins,))
+        self.marginal_cost = self.freeze(marginal_cost, (len(self.sources),))
+        self.carbon_intensity = self.freeze(carbon_intensity, (len(self.sources),))
+
+    @staticmethod
+    def freeze(values, shape: tuple) -> np.ndarray:
+        array = np.ascontiguousarray(values, dtype=float)
+
+        if array.ndim != len(shape) or any(
+            expected is not None and n != expected
+            for n, expected in zip(array.shape, shape)
+        ):
+            raise ValueError(f"expected an array of shape {shape}, got {array.shape}")
+
+        if array is values:
+            array = array.copy()
+
+        array.setflags(write=False)
+        return array
+
+    @classmethod
+    def from_sources(cls, start, sources: list, availability, consumption, **kwargs):
+        """bundle the availability of power sources with their properties"""
+        return cls(
+            start,
+            availability,
+            consumption,
+            [source.__class__.__name__ for source in sources],
+            [source.marginal_cost for source in sources],
+            [source.carbon_intensity for source in sources],
+            **kwargs,
+        )
+
+    @property
+    def n_bins(self) -> int:
+        return self.availability.shape[1]
+
+    @property
+    def end(self):
+        return self.start + timedelta(seconds=self.n_bins * self.resolution)
+
+    @property
+    def times(self) -> np.ndarray:
+        """UTC time of each bin"""
+        return np.datetime64(int(self.start.timestamp()), "s") + np.arange(
+            self.n_bins
+        ) * np.timedelta64(self.resolution, "s")
+
+    def mix_carbon_intensity(self, production) -> np.ndarray:
+        """carbon intensity of the production mix for each bin
+
+        :param production: production of each source for each bin
+        :type production: np.ndarray
+        :return: carbon intensity for each bin
+        :rtype: np.ndarray
+        """
+        return (self.carbon_intensity @ production) / production.sum(axis=0)
@@ -1,105 +1,240 @@
-import cvxpy as cp
 import numpy as np
 
 from .resources import RTEAPI, ElectricityMapsAPI
+from .unavailability import UnitUnavailabilities
 
-from .utils import str_to_datetime, datetime_to_str, now, interp
-from datetime import timedelta
+from .utils import bin_count, str_to_datetime, datetime_to_str, now, parse_timestamps
+from datetime import datetime, timedelta
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 
 import pandas as pd
 
 
-class History:
-    def __init__(self):
-        self.api = RTEAPI()
+class Columns:
+    """columns of RTE values, accumulated response by response
+
+    Each batch of values is converted to arrays of start and end times (in
+    seconds since epoch) and values, along with integer codes for the
+    categorical keys (e.g. production type) they belong to, so that no
+    intermediate object is kept per value.
+    """
+
+    def __init__(self, *keys):
+        self.keys = keys
+        self.categories = {key: {} for key in keys}
+        self.chunks = []
+
+    def append(self, values: list, **keys):
+        codes = {
+            key: self.categories[key].setdefault(keys[key], len(self.categories[key]))
+            for key in self.keys
+        }
+
+        start = parse_timestamps([v["start_date"] for v in values])
+        end = parse_timestamps([v["end_date"] for v in values])
+        value = np.fromiter(
+            (np.nan if v["value"] is None else v["value"] for v in values),
+            dtype=float,
+            count=len(values),
+        )
 
-    def retrieve_consumption(self, start, end) -> pd.DataFrame:
-        start_dt = str_to_datetime(start)
-        end_dt = str_to_datetime(end)
+        self.chunks.append((codes, start, end, value))
+
+    def arrays(self) -> dict:
+        """concatenated columns, with categorical keys as integer codes"""
+        lengths = [len(chunk[3]) for chunk in self.chunks]
+
+        arrays = {
+            key: np.repeat(
+                np.array([chunk[0][key] for chunk in self.chunks], dtype=np.int32),
+                lengths,
+            )
+            for key in self.keys
+        }
+
+        for i, column in enumerate(["start_date", "end_date", "value"]):
+            arrays[column] = np.concatenate(
+                [chunk[i + 1] for chunk in self.chunks]
+                or [np.zeros(0, dtype=np.int64 if i < 2 else float)]
+            )
 
-        periods = pd.date_range(start=start_dt, end=end_dt, freq="1W")
-        periods = zip(periods[:-1], periods[1:])
+        return arrays
 
-        stats = []
+    def groups(self, *keys):
+        """yield the category and the columns of each group of values"""
+        arrays = self.arrays()
 
-        for t0, t1 in periods:
-            start_rq = datetime_to_str(t0)
-            end_rq = datetime_to_str(t1)
+        codes = np.stack([arrays[key] for key in keys], axis=1)
+        categories = [list(self.categories[key]) for key in keys]
 
-            res = self.api.request(
-                f"http://digital.iservices.rte-france.com/open_api/consumption/v1/short_term?start_date={start_rq}&end_date={end_rq}",
+        for group in np.unique(codes, axis=0):
+            mask = np.all(codes == group, axis=1)
+            yield tuple(categories[i][code] for i, code in enumerate(group)), {
+                column: arrays[column][mask]
+                for column in ["start_date", "end_date", "value"]
+            }
+
+    def frame(self) -> pd.DataFrame:
+        arrays = self.arrays()
+
+        columns = {
+            key: pd.Categorical.from_codes(arrays[key], list(self.categories[key]))
+            for key in self.keys
+        }
+
+        for column in ["start_date", "end_date"]:
+            columns[column] = pd.to_datetime(arrays[column], unit="s", utc=True)
+
+        columns["value"] = arrays["value"]
+
+        return pd.DataFrame(columns)
+
+
+class History:
+    # delay after which RTE data is assumed to be complete
+    publication_delay = timedelta(days=1)
+
+    def __init__(self, max_workers: int = 4, max_retries: int = 3, backoff: float = 1.0):
+        """
+        :param max_workers: amount of pages downloaded concurrently, defaults to 4
+        :type max_workers: int, optional
+        :param max_retries: amount of retries of rate-limited or failed pages, defaults to 3
+        :type max_retries: int, optional
+        :param backoff: delay before the first retry in seconds, defaults to 1.0
+        :type backoff: float, optional
+        """
+        self.api = RTEAPI(max_retries=max_retries, backoff=backoff)
+        # pages are only read once, keeping them in memory would waste it
+        self.api.remember = False
+        self.max_workers = max_workers
+
+    def fetch(self, urls: list):
+        """download pages concurrently
+
+        At most twice as many pages as workers are held at any time.
+
+        :param urls: urls of the pages
+        :type urls: list
+        :return: responses, in the same order as urls
+        :rtype: generator
+        """
+        urls = iter(urls)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = deque(
+                executor.submit(self.api.request, url)
+                for url in islice(urls, 2 * self.max_workers)
             )
 
-            data = res.json()["short_term"]
+            while pending:
+                res = pending.popleft().result()
 
-            for row in data:
-                for v in row["values"]:
-                    stats.append(
-                        {
-                            "start_date": v["start_date"],
-                            "end_date": v["end_date"],
-                            "value": v["value"],
-                        }
-                    )
+                for url in islice(urls, 1):
+                    pending.append(executor.submit(self.api.request, url))
 
-        return pd.DataFrame(stats).sort_values("start_date")
+                yield res
 
-    def retrieve_production(self, start, end) -> pd.DataFrame:
+    def urls(self, url, start_dt, end_dt, freq) -> list:
+        # both bounds need the same offset, even if a DST change is in between
+        end_dt = end_dt.astimezone(start_dt.tzinfo)
+
+        # windows are aligned on freq, and bounded by start and end
+        periods = pd.date_range(start=start_dt, end=end_dt, freq=freq)
+        periods = periods.union(pd.DatetimeIndex([start_dt, end_dt]))
+
+        return [
+            url.format(start=datetime_to_str(t0), end=datetime_to_str(t1))
+            for t0, t1 in zip(periods[:-1], periods[1:])
+        ]
+
+    def retrieve_consumption(self, start, end) -> pd.DataFrame:
+        return (
+            self.retrieve_consumption_columns(start, end)
+            .frame()
+            .sort_values("start_date")
+        )
+
+    def retrieve_consumption_columns(self, start, end) -> Columns:
         start_dt = str_to_datetime(start)
         end_dt = str_to_datetime(end)
 
-        periods = pd.date_range(start=start_dt, end=end_dt, freq="3M")
-        periods = zip(periods[:-1], periods[1:])
+        urls = self.urls(
+            "http://digital.iservices.rte-france.com/open_api/consumption/v1/short_term?start_date={start}&end_date={end}",
+            start_dt,
+            end_dt,
+            "1W",
+        )
 
-        stats = []
+        columns = Columns()
 
-        for t0, t1 in periods:
-            start_rq = datetime_to_str(t0)
-            end_rq = datetime_to_str(t1)
+        for res in self.fetch(urls):
+            for row in res.json()["short_term"]:
+                columns.append(row["values"])
 
-            res = self.api.request(
-                f"http://digital.iservices.rte-france.com/open_api/actual_generation/v1/actual_generations_per_production_type?start_date={start_rq}&end_date={end_rq}",
-            )
+        return columns
 
-            data = res.json()["actual_generations_per_production_type"]
+    def retrieve_production(self, start, end) -> pd.DataFrame:
+        return (
+            self.retrieve_production_columns(start, end)
+            .frame()
+            .sort_values(["production_type", "start_date"])
+        )
 
-            for row in data:
-                production_type = row["production_type"]
-                for v in row["values"]:
-                    stats.append(
-                        {
-                            "production_type": production_type,
-                            "start_date": v["start_date"],
-                            "end_date": v["end_date"],
-                            "value": v["value"],
-                        }
-                    )
-
-        return pd.DataFrame(stats).sort_values(["production_type", "start_date"])
+    def retrieve_production_columns(self, start, end) -> Columns:
+        start_dt = str_to_datetime(start)
+        end_dt = str_to_datetime(end)
+
+        urls = self.urls(
+            "http://digital.iservices.rte-france.com/open_api/actual_generation/v1/actual_generations_per_production_type?start_date={start}&end_date={end}",
+            start_dt,
+            end_dt,
+            "3MS",
+        )
+
+        columns = Columns("production_type")
+
+        for res in self.fetch(urls):
+            for row in res.json()["actual_generations_per_production_type"]:
+                columns.append(row["values"], production_type=row["production_type"])
+
+        return columns
 
     def retrieve_unavailability(self, start, end) -> pd.DataFrame:
         start_dt = str_to_datetime(start)
         end_dt = str_to_datetime(end)
-        n_bins = int((end_dt - start_dt).total_seconds() / 3600)
         bins = pd.date_range(start=start_dt, end=end_dt, freq="1h")[:-1]
 
-        assert n_bins == len(bins)
-
-        periods = pd.date_range(start=start_dt, end=end_dt, freq="2W")
-        periods = zip(periods[:-1], periods[1:])
+        capacities = (
+            self.retrieve_unavailability_intervals(start, end).unavailable_capacities()
+        )
 
-        units = {}
-        unit_production_type = {}
+        unavailability = pd.DataFrame(
+            {"unavailability": np.concatenate(list(capacities.values()) or [[]])},
+            index=pd.MultiIndex.from_product(
+                [list(capacities), bins], names=["production_type", "t"]
+            ),
+        )
+        return unavailability.sort_index()
 
-        for t0, t1 in periods:
-            start_rq = datetime_to_str(t0)
-            end_rq = datetime_to_str(t1)
+    def retrieve_unavailability_intervals(
+        self, start, end, resolution: int = 3600
+    ) -> UnitUnavailabilities:
+        start_dt = str_to_datetime(start)
+        end_dt = str_to_datetime(end)
+        n_bins = bin_count(start_dt, end_dt, resolution)
 
-            url = f"http://digital.iservices.rte-france.com/open_api/unavailability_additional_information/v4/generation_unavailabilities?date_type=APPLICATION_DATE&start_date={start_rq}&end_date={end_rq}&last_version=true"
+        urls = self.urls(
+            "http://digital.iservices.rte-france.com/open_api/unavailability_additional_information/v4/generation_unavailabilities?date_type=APPLICATION_DATE&start_date={start}&end_date={end}&last_version=true",
+            start_dt,
+            end_dt,
+            "2W",
+        )
 
-            api = RTEAPI()
-            res = api.request(url)
+        units = UnitUnavailabilities(start_dt, n_bins, resolution)
 
+        for url, res in zip(urls, self.fetch(urls)):
             try:
                 data = res.json()
             except:
@@ -118,92 +253,157 @@ class History:
                 if unavailability["status"] == "DISMISSED":
                     continue
 
-                unit = unavailability["unit"]["eic_code"]
-
-                if unit not in units:
-                    units[unit] = np.zeros(n_bins)
-
-                unit_production_type[unit] = unavailability["production_type"]
-
-                for v in unavailability["values"]:
-                    unavail_start_dtime = str_to_datetime(v["start_date"])
-                    unavail_end_dtime = str_to_datetime(v["end_date"])
-
-                    t_begin = int(
-                        (unavail_start_dtime - start_dt).total_seconds() / 3600
-                    )
-                    t_end = int((unavail_end_dtime - start_dt).total_seconds() / 3600)
-
-                    units[unit][t_begin:t_end] = np.maximum(
-                        units[unit][t_begin:t_end], v["unavailable_capacity"]
-                    )
-
-        units = pd.concat(
-            [
-                pd.DataFrame(
-                    {
-                        "unit": [unit] * n_bins,
-                        "production_type": [unit_production_type[unit]] * n_bins,
-                        "t": bins,
-                        "unavailability": units[unit],
-                    }
+                units.add(
+                    unavailability["unit"]["eic_code"],
+                    unavailability["production_type"],
+                    unavailability["values"],
                 )
-                for unit in units
-            ]
-        )
 
-        unavailability = units.groupby(["production_type", "t"]).agg(
-            unavailability=("unavailability", "sum")
-        )
-        return unavailability
+        return units
 
     def retrieve_imports(self, start, end) -> pd.DataFrame:
+        return (
+            self.retrieve_imports_columns(start, end)
+            .frame()
+            .sort_values(["sender", "receiver", "start_date"])
+        )
+
+    def retrieve_imports_columns(self, start, end) -> Columns:
         start_dt = str_to_datetime(start)
         end_dt = str_to_datetime(end)
 
-        periods = pd.date_range(start=start_dt, end=end_dt, freq="2W")
-        periods = zip(periods[:-1], periods[1:])
-
-        stats = []
-
-        for t0, t1 in periods:
-            start_rq = datetime_to_str(t0)
-            end_rq = datetime_to_str(t1)
-
-            url = f"http://digital.iservices.rte-france.com/open_api/physical_flow/v1/physical_flows?start_date={start_rq}&end_date={end_rq}"
+        urls = self.urls(
+            "http://digital.iservices.rte-france.com/open_api/physical_flow/v1/physical_flows?start_date={start}&end_date={end}",
+            start_dt,
+            end_dt,
+            "2W",
+        )
 
-            res = self.api.request(url)
+        columns = Columns("sender", "receiver")
 
+        for url, res in zip(urls, self.fetch(urls)):
             try:
-                data = res.json()
+                data = res.json()["physical_flows"]
             except:
                 print(f"request failed: {url}")
                 print(res.status_code)
                 print(res.content)
                 continue
 
-            data = res.json()["physical_flows"]
-
             for row in data:
-                sender = row["sender_country_name"]
-                receiver = row["receiver_country_name"]
-
-                for v in row["values"]:
-                    stats.append(
-                        {
-                            "sender": sender,
-                            "receiver": receiver,
-                            "start_date": v["start_date"],
-                            "end_date": v["end_date"],
-                            "value": v["value"],
-                        }
-                    )
-
-        return pd.DataFrame(stats).sort_values(["sender", "receiver", "start_date"])
+                columns.append(
+                    row["values"],
+                    sender=row["sender_country_name"],
+                    receiver=row["receiver_country_name"],
+                )
 
-    def retrieve_carbon_intensity(self):
-        from datetime import datetime
+        return columns
+
+    def store(self, store, dataset: str, start, end):
+        """retrieve a dataset between start and end and write it to a history store
+
+        :param store: history store
+        :type store: HistoryStore
+        :param dataset: production, consumption, imports or unavailability
+        :type dataset: str
+        :param start: start time
+        :type start: str
+        :param end: end time
+        :type end: str
+        """
+        if dataset == "production":
+            columns = self.retrieve_production_columns(start, end)
+
+            for (production_type,), values in columns.groups("production_type"):
+                store.write_intervals(
+                    dataset,
+                    production_type,
+                    values["start_date"],
+                    values["end_date"],
+                    values["value"],
+                    start,
+                    end,
+                )
+        elif dataset == "consumption":
+            values = self.retrieve_consumption_columns(start, end).arrays()
+            store.write_intervals(
+                dataset,
+                "consumption",
+                values["start_date"],
+                values["end_date"],
+                values["value"],
+                start,
+                end,
+            )
+        elif dataset == "imports":
+            columns = self.retrieve_imports_columns(start, end)
+
+            for (sender, receiver), values in columns.groups("sender", "receiver"):
+                store.write_intervals(
+                    dataset,
+                    f"{sender}_to_{receiver}",
+                    values["start_date"],
+                    values["end_date"],
+                    values["value"],
+                    start,
+                    end,
+                )
+        elif dataset == "unavailability":
+            units = self.retrieve_unavailability_intervals(
+                start, end, store.resolution
+            )
 
+            for production_type, values in units.unavailable_capacities().items():
+                store.write(dataset, production_type, start, values)
+        else:
+            raise ValueError(f"unknown dataset '{dataset}'")
+
+    def sync(self, store, dataset: str, start, end) -> list:
+        """retrieve the parts of a dataset between start and end that are missing from a history store
+
+        :param store: history store
+        :type store: HistoryStore
+        :param dataset: production, consumption, imports or unavailability
+        :type dataset: str
+        :param start: start time
+        :type start: str
+        :param end: end time, capped to the current hour
+        :type end: str
+        :return: retrieved time ranges (in seconds since epoch)
+        :rtype: list
+        """
+        start = str_to_datetime(start) if isinstance(start, str) else start
+        end = str_to_datetime(end) if isinstance(end, str) else end
+
+        current_hour = now().replace(minute=0, second=0, microsecond=0)
+        end = min(end, current_hour)
+
+        # data older than this is not expected to be published later
+        published = int((current_hour - self.publication_delay).timestamp())
+
+        gaps = store.missing(dataset, start, end)
+
+        for gap_start, gap_end in gaps:
+            # the offset of start is kept across DST changes
+            self.store(
+                store,
+                dataset,
+                datetime_to_str(datetime.fromtimestamp(gap_start, start.tzinfo)),
+                datetime_to_str(datetime.fromtimestamp(gap_end, start.tzinfo)),
+            )
+
+            # recent hours without data are retrieved again on the next sync
+            covered = max(
+                min(gap_end, published),
+                store.last_value_end(dataset, gap_start, gap_end) or gap_start,
+            )
+
+            if covered > gap_start:
+                store.cover(dataset, gap_start, covered)
+
+        return gaps
+
+    def retrieve_carbon_intensity(self):
         expiration = now().replace(minute=0, second=0) + timedelta(days=1)
 
         api = ElectricityMapsAPI()
@@ -1,47 +1,45 @@
-import cvxpy as cp
-import numpy as np
-
-from .sources import (
-    WindPower,
-    SolarPower,
-    NuclearPower,
-    GasPower,
-    CoalPower,
-    BiomassPower,
-    HydroPower,
-    StoredHydroPower,
-    ReservoirHydroPower,
-    ImportedPower,
-)
+from .forecast import ForecastBundle
 from .production import ProductionPrediction
+from .scheduling import schedule
 
 
 class Optimizer:
-    def __init__(self):
-        self.sources = [
-            WindPower(),
-            SolarPower(),
-            NuclearPower(),
-            GasPower(),
-            CoalPower(),
-            BiomassPower(),
-            HydroPower(),
-            ReservoirHydroPower(),
-            ImportedPower(),
-        ]
-
-        self.prediction = ProductionPrediction(self.sources)
+    def __init__(self, max_workers: int = None, resolution: int = 3600):
+        """
+        :param max_workers: amount of sources whose availability is fetched concurrently, defaults to None (sequential)
+        :type max_workers: int, optional
+        :param resolution: duration of each bin in seconds, defaults to 3600
+        :type resolution: int, optional
+        """
+        self.resolution = resolution
+        self.prediction = ProductionPrediction(
+            max_workers=max_workers, resolution=resolution
+        )
+        self.sources = self.prediction.sources
 
-    def optimize(self, min_time, max_time, start=None, end=None, carbon_intensity=None):
-        production = self.prediction.dispatch(start, end)
+    def forecast(self, start, end) -> ForecastBundle:
+        return self.prediction.forecast(start, end)
+
+    def predict_carbon_intensity(self, start=None, end=None, forecast=None):
+        if forecast is None:
+            forecast = self.forecast(start, end)
+
+        production = self.prediction.dispatch(forecast=forecast)
+        return forecast.mix_carbon_intensity(production)
 
+    def optimize(self, min_time, max_time, start=None, end=None, carbon_intensity=None):
         if carbon_intensity is None:
-            sources_carbon_intensity = np.array(
-                [source.carbon_intensity for source in self.sources]
-            )
+            carbon_intensity = self.predict_carbon_intensity(start, end)
+
+        command = schedule(carbon_intensity, min_time, max_time)
+
+        if command is not None:
+            return command
+
+        return self.solve(carbon_intensity, min_time, max_time)
 
-            carbon_intensity = sources_carbon_intensity @ production
-            carbon_intensity /= production.sum(axis=0)
+    def solve(self, carbon_intensity, min_time, max_time):
+        import cvxpy as cp
 
         n_bins = len(carbon_intensity)
 
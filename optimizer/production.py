@@ -1,22 +1,53 @@
-import cvxpy as cp
+import contextvars
+
 import numpy as np
 
+from .dispatch import lp_dispatcher, merit_order_dispatch
+from .forecast import ForecastBundle
 from .resources import RTEAPI
+from .sources import source_registry
 
-from .utils import str_to_datetime, datetime_to_str, now, interp
+from .utils import str_to_datetime, datetime_to_str, interp, bin_count, bin_values
 from datetime import timedelta
-
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 
 
 class ProductionPrediction:
-    def __init__(self, sources: list):
+    def __init__(
+        self,
+        sources: list = None,
+        max_workers: int = None,
+        method: str = "merit_order",
+        resolution: int = 3600,
+    ):
+        """
+        :param sources: power sources, defaults to None (the optimizer's sources from the source registry)
+        :type sources: list, optional
+        :param max_workers: amount of sources whose availability is fetched concurrently, defaults to None (sequential)
+        :type max_workers: int, optional
+        :param method: dispatch method, "merit_order" or "lp" (linear program), defaults to "merit_order"
+        :type method: str, optional
+        :param resolution: duration of each bin in seconds, defaults to 3600
+        :type resolution: int, optional
+        """
+        if method not in ["merit_order", "lp"]:
+            raise ValueError(f"unknown dispatch method '{method}'")
+
+        self.registry = None
+
+        if sources is None:
+            self.registry = source_registry()
+            sources = self.registry.sources()
+
         self.sources = sources
+        self.max_workers = max_workers
+        self.method = method
+        self.resolution = resolution
 
     def get_consumption(self, start, end):
         start_dtime = str_to_datetime(start)
         end_dtime = str_to_datetime(end)
-        n_bins = int((end_dtime - start_dtime).total_seconds() / 3600)
+        n_bins = bin_count(start_dtime, end_dtime, self.resolution)
 
         start_rq = datetime_to_str(start_dtime.replace(hour=0, minute=0, second=0))
         end_rq = datetime_to_str(
@@ -34,61 +65,84 @@ class ProductionPrediction:
         data = res.json()
 
         for forecast in data["short_term"]:
-            t_begin = np.array(
-                [
-                    (str_to_datetime(v["start_date"]) - start_dtime).total_seconds()
-                    / 3600
-                    for v in forecast["values"]
-                ]
-            ).astype(int)
-
-            t_end = np.array(
-                [
-                    (str_to_datetime(v["end_date"]) - start_dtime).total_seconds()
-                    / 3600
-                    for v in forecast["values"]
-                ]
-            ).astype(int)
-
-            values = np.array([v["value"] for v in forecast["values"]])
-
-            for i in range(len(t_begin)):
-                consumption[t_begin[i] : t_end[i]] += values[i]
-                data_points[t_begin[i] : t_end[i]] += 1
+            values, points = bin_values(
+                forecast["values"], start_dtime, n_bins, self.resolution
+            )
+            consumption += values
+            data_points += points
 
         consumption = consumption / data_points
         consumption = interp(consumption, kind="nearest")
         return consumption
 
-    def dispatch(self, start, end):
-        consumption = self.get_consumption(start, end)
-
-        n_bins = len(consumption)
-        n_sources = len(self.sources)
-
-        availability = np.array(
-            [self.sources[i].get_availability(start, end) for i in range(n_sources)]
+    def get_availability(self, start, end) -> np.ndarray:
+        n_bins = bin_count(start, end, self.resolution)
+        availability = np.empty((len(self.sources), n_bins))
+
+        if self.max_workers is None or self.max_workers <= 1:
+            for i, source in enumerate(self.sources):
+                availability[i] = source.get_availability(start, end, self.resolution)
+
+            return availability
+
+        # each task runs in a copy of the caller's context (e.g. cache revalidation)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(
+                    contextvars.copy_context().run,
+                    source.get_availability,
+                    start,
+                    end,
+                    self.resolution,
+                )
+                for source in self.sources
+            ]
+
+            for i, future in enumerate(futures):
+                availability[i] = future.result()
+
+        return availability
+
+    def forecast(self, start, end) -> ForecastBundle:
+        """availability and consumption forecast between start and end
+
+        :param start: start time
+        :type start: str
+        :param end: end time
+        :type end: str
+        :rtype: ForecastBundle
+        """
+        if self.registry is not None:
+            # apply changes to the configuration of the sources
+            self.registry.config()
+
+        return ForecastBundle.from_sources(
+            str_to_datetime(start),
+            self.sources,
+            self.get_availability(start, end),
+            self.get_consumption(start, end),
+            resolution=self.resolution,
         )
-        marginal_cost = np.array(
-            [self.sources[i].marginal_cost for i in range(n_sources)]
-        )
-
-        x = cp.Variable((n_sources, n_bins))
-
-        constraints = [
-            x >= 0,  # production must be positive
-            x
-            <= availability,  # production from each source cannot exceed availability at any time
-            cp.sum(x, axis=0)
-            >= consumption,  # total production must meet demand at any time
-        ]
 
-        prob = cp.Problem(
-            cp.Minimize(cp.sum(marginal_cost @ x)),
-            constraints,
+    def dispatch(self, start=None, end=None, forecast: ForecastBundle = None):
+        """production of each source for each bin
+
+        :param start: start time, if no forecast is given
+        :type start: str, optional
+        :param end: end time, if no forecast is given
+        :type end: str, optional
+        :param forecast: forecast to dispatch, defaults to None (retrieved between start and end)
+        :type forecast: ForecastBundle, optional
+        :rtype: np.ndarray
+        """
+        if forecast is None:
+            forecast = self.forecast(start, end)
+
+        if self.method == "merit_order":
+            return merit_order_dispatch(
+                forecast.availability, forecast.consumption, forecast.marginal_cost
+            )
+
+        return lp_dispatcher(len(forecast.sources), forecast.n_bins).solve(
+            forecast.availability, forecast.consumption, forecast.marginal_cost
         )
-
-        prob.solve()
-        production = x.value
-
-        return production
@@ -4,17 +4,62 @@ from datetime import datetime
 from os import getenv
 import re
 import requests
+import threading
+import time
+
+from contextlib import contextmanager
+from contextvars import ContextVar
 
 import base64
-import pickle
 
 import hashlib
 
-from .utils import str_to_datetime, now
-from os.path import exists, join as opj
+from .cache import CachedResponse, ResponseCache
+from .utils import str_to_datetime
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def session() -> requests.Session:
+    """HTTP session shared by every API client, so connections are pooled"""
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+
+    return _session
+
+
+# time at which the current revalidation started, if any
+_revalidating = ContextVar("revalidating", default=None)
+
+
+@contextmanager
+def revalidate():
+    """fetch resources again even if their cached payload is still valid
+
+    Fetched payloads are still written to the cache. Payloads written after
+    the revalidation started (e.g. by another worker) are not fetched again.
+    """
+    token = _revalidating.set(time.time())
+    try:
+        yield
+    finally:
+        _revalidating.reset(token)
 
 
 class Resource:
+    cache = ResponseCache()
+
+    # whether payloads are also kept in the in-memory cache
+    remember = True
+
     def __init__(self, fetch_cache: bool = True, debug: bool = False):
         self.fetch_cache = fetch_cache
         self.debug = debug
@@ -22,41 +67,130 @@ class Resource:
     def retrieve_cache(self, resource):
         hash = hashlib.md5(resource.encode("utf-8")).hexdigest()
 
-        cached_file = opj(".cache", f"{hash}.pickle")
+        data = self.cache.get(hash, remember=self.remember)
 
-        if not exists(cached_file):
+        if data is None:
             return None
 
-        cache_expiration_file = opj(".cache", f"{hash}.expires")
+        return CachedResponse(200, data)
+
+    def write_cache(self, resource, data, cache_expiration=None):
+        hash = hashlib.md5(resource.encode("utf-8")).hexdigest()
+
+        if cache_expiration is not None:
+            cache_expiration = str_to_datetime(cache_expiration).timestamp()
 
-        if exists(cache_expiration_file):
-            expiration = str_to_datetime(open(cache_expiration_file, "r").read())
-            if now() > expiration:
-                return None
+        self.cache.set(hash, data, cache_expiration, remember=self.remember)
 
-        with open(cached_file, "rb") as fp:
-            res = pickle.load(fp)
+    def decode(self, resource, res, cache_expiration=None):
+        """decode a successful response once and cache the decoded payload"""
+        if res.status_code != 200:
             return res
 
-    def write_cache(self, resource, data, cache_expiration=None):
+        try:
+            res = CachedResponse(res.status_code, res.json())
+        except ValueError:
+            return res
+
+        self.write_cache(resource, res.data, cache_expiration)
+        return res
+
+    def request(self, resource, cache_expiration=None):
         hash = hashlib.md5(resource.encode("utf-8")).hexdigest()
 
-        with open(opj(".cache", f"{hash}.pickle"), "wb") as fp:
-            pickle.dump(data, fp)
+        revalidating = _revalidating.get()
 
-        if cache_expiration is not None:
-            with open(opj(".cache", f"{hash}.expires"), "w") as fp:
-                fp.write(cache_expiration)
+        if revalidating is not None:
+            with self.cache.lock(hash):
+                # another worker may have revalidated the resource in the meantime
+                written = self.cache.written(hash) if self.fetch_cache else None
+
+                if written is not None and written >= revalidating:
+                    data = self.cache.get(hash, stale=True, remember=self.remember)
+
+                    if data is not None:
+                        return CachedResponse(200, data)
+
+                return self.refresh(resource, cache_expiration)
+
+        if self.fetch_cache:
+            res = self.retrieve_cache(resource)
+
+            if res is not None:
+                return res
+
+        # only one worker refreshes a given resource at a time;
+        # the others serve the expired payload if there is one, or wait.
+        with self.cache.lock(hash, blocking=False) as acquired:
+            if acquired:
+                return self.update(resource, cache_expiration)
+
+        if self.fetch_cache:
+            data = self.cache.get(hash, stale=True, remember=self.remember)
+
+            if data is not None:
+                return CachedResponse(200, data)
+
+        with self.cache.lock(hash):
+            return self.update(resource, cache_expiration)
+
+    def update(self, resource, cache_expiration=None):
+        # another worker may have refreshed the resource while we were waiting
+        if self.fetch_cache:
+            res = self.retrieve_cache(resource)
+
+            if res is not None:
+                return res
+
+        return self.refresh(resource, cache_expiration)
+
+    def refresh(self, resource, cache_expiration=None):
+        res = self.fetch(resource)
+        res = self.decode(resource, res, cache_expiration)
+
+        if self.debug:
+            print(f"request: {resource}")
+            print(f"status: {res.status_code}")
+
+            try:
+                print(res.json())
+            except:
+                pass
+
+        return res
 
     @abstractmethod
-    def request(self, resource, cache_expiration=None):
+    def fetch(self, resource):
         pass
 
 
 class RTEAPI(Resource):
-    def __init__(self, fetch_cache: bool = True, debug: bool = False):
+    # the OAuth token is shared by every client until it expires
+    token_lock = threading.Lock()
+    access_token = None
+    token_expiration = 0
+    token_margin = 60
+
+    def __init__(
+        self,
+        fetch_cache: bool = True,
+        debug: bool = False,
+        max_retries: int = 0,
+        backoff: float = 1.0,
+    ):
+        """
+        :param fetch_cache: whether to use cached responses, defaults to True
+        :type fetch_cache: bool, optional
+        :param debug: whether to print requests, defaults to False
+        :type debug: bool, optional
+        :param max_retries: amount of retries on rate-limiting (429) and server (5xx) errors, defaults to 0
+        :type max_retries: int, optional
+        :param backoff: delay before the first retry in seconds, doubled at each retry, defaults to 1.0
+        :type backoff: float, optional
+        """
         super().__init__(fetch_cache=fetch_cache, debug=debug)
-        self.access_token = None
+        self.max_retries = max_retries
+        self.backoff = backoff
 
     def auth(self):
         self.api_client = getenv("RTE_API_CLIENT")
@@ -66,7 +200,7 @@ class RTEAPI(Resource):
         code = base64.b64encode(credentials.encode("ascii"))
         code = code.decode("ascii")
 
-        res = requests.post(
+        res = session().post(
             f"https://digital.iservices.rte-france.com/token/oauth/",
             headers={
                 "Authorization": f"Basic {code}",
@@ -75,35 +209,47 @@ class RTEAPI(Resource):
         )
 
         data = res.json()
-        self.access_token = data["access_token"]
-
-    def request(self, resource, cache_expiration=None):
-        if self.fetch_cache:
-            res = self.retrieve_cache(resource)
-        else:
-            res = None
+        RTEAPI.access_token = data["access_token"]
+        RTEAPI.token_expiration = (
+            time.monotonic() + data.get("expires_in", 3600) - RTEAPI.token_margin
+        )
 
-        if res is not None:
-            return res
+    def token(self, renew: bool = False):
+        with RTEAPI.token_lock:
+            if (
+                renew
+                or RTEAPI.access_token is None
+                or time.monotonic() > RTEAPI.token_expiration
+            ):
+                self.auth()
 
-        if self.access_token is None:
-            self.auth()
+            return RTEAPI.access_token
 
-        res = requests.get(
-            resource, headers={"Authorization": f"Bearer {self.access_token}"}
+    def get(self, resource):
+        res = session().get(
+            resource, headers={"Authorization": f"Bearer {self.token()}"}
         )
 
-        if res.status_code == 200:
-            self.write_cache(resource, res, cache_expiration)
+        if res.status_code == 401:
+            res = session().get(
+                resource, headers={"Authorization": f"Bearer {self.token(renew=True)}"}
+            )
 
-        if self.debug:
-            print(f"request: {resource}")
-            print(f"status: {res.status_code}")
+        return res
 
-            try:
-                print(res.json())
-            except:
-                pass
+    def fetch(self, resource):
+        res = self.get(resource)
+
+        for attempt in range(self.max_retries):
+            if res.status_code != 429 and res.status_code < 500:
+                break
+
+            delay = self.backoff * 2**attempt
+            if res.headers.get("Retry-After", "").isdigit():
+                delay = max(delay, int(res.headers["Retry-After"]))
+
+            time.sleep(delay)
+            res = self.get(resource)
 
         return res
 
@@ -120,29 +266,6 @@ class ElectricityMapsAPI(Resource):
 
         self.api_key = getenv("EM_API_PRIMARY_KEY")
 
-    def request(self, resource, cache_expiration=None):
-        if self.fetch_cache:
-            res = self.retrieve_cache(resource)
-        else:
-            res = None
-
-        if res is not None:
-            return res
-
+    def fetch(self, resource):
         url = f"https://api-access.electricitymaps.com/{self.api_base_url}/{resource}"
-
-        res = requests.get(url, headers={"auth-token": self.api_key})
-
-        if res.status_code == 200:
-            self.write_cache(resource, res, cache_expiration)
-
-        if self.debug:
-            print(f"request: {url}")
-            print(f"status: {res.status_code}")
-
-            try:
-                print(res.json())
-            except:
-                pass
-
-        return res
+        return session().get(url, headers={"auth-token": self.api_key})
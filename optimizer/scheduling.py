@@ -0,0 +1,86 @@
+import numpy as np
+
+
+def schedule(carbon_intensity, min_time, max_time):
+    """select the cheapest bins to charge in
+
+    Equivalent to the integer program ``min carbon_intensity @ x`` subject to
+    ``x in {0, 1}`` and ``sum(x[:max_time]) >= min_time``, solved exactly by
+    a partial sort of the first ``max_time`` bins. Ties are broken in favour
+    of the earliest bins.
+
+    :param carbon_intensity: carbon intensity of each bin
+    :type carbon_intensity: np.ndarray
+    :param min_time: amount of bins to charge in
+    :type min_time: int
+    :param max_time: amount of bins within which charging must happen
+    :type max_time: int
+    :return: 0/1 command for each bin, or None if the constraints cannot be handled
+    :rtype: np.ndarray
+    """
+    carbon_intensity = np.asarray(carbon_intensity, dtype=float)
+    n_bins = len(carbon_intensity)
+
+    if np.any(np.isnan(carbon_intensity)):
+        return None
+
+    if min_time > min(max_time, n_bins):
+        return None
+
+    command = np.zeros(n_bins)
+
+    # bins with negative intensity always reduce emissions
+    command[carbon_intensity < 0] = 1
+
+    if min_time <= 0:
+        return command
+
+    window = carbon_intensity[:max_time]
+    threshold = np.partition(window, min_time - 1)[min_time - 1]
+
+    below = np.flatnonzero(window < threshold)
+    ties = np.flatnonzero(window == threshold)[: min_time - len(below)]
+
+    command[below] = 1
+    command[ties] = 1
+
+    return command
+
+
+def schedule_batch(carbon_intensity, min_times, max_times):
+    """select the cheapest bins to charge in for several requests at once
+
+    Vectorized counterpart of :func:`schedule` sharing a single sort of the
+    carbon intensity curve between all requests.
+
+    :param carbon_intensity: carbon intensity of each bin
+    :type carbon_intensity: np.ndarray
+    :param min_times: amount of bins to charge in, for each request
+    :type min_times: np.ndarray
+    :param max_times: amount of bins within which charging must happen, for each request
+    :type max_times: np.ndarray
+    :return: 0/1 command for each request and each bin, or None if the constraints cannot be handled
+    :rtype: np.ndarray
+    """
+    carbon_intensity = np.asarray(carbon_intensity, dtype=float)
+    min_times = np.asarray(min_times, dtype=int)
+    max_times = np.asarray(max_times, dtype=int)
+    n_bins = len(carbon_intensity)
+
+    if np.any(np.isnan(carbon_intensity)):
+        return None
+
+    if np.any(min_times > np.minimum(max_times, n_bins)):
+        return None
+
+    order = np.argsort(carbon_intensity, kind="stable")
+
+    in_window = order[np.newaxis, :] < max_times[:, np.newaxis]
+    rank = np.cumsum(in_window, axis=1)
+    selected = in_window & (rank <= min_times[:, np.newaxis])
+
+    commands = np.zeros((len(min_times), n_bins))
+    commands[:, order] = selected
+    commands[:, carbon_intensity < 0] = 1
+
+    return commands
@@ -0,0 +1,185 @@
+import hashlib
+import logging
+import threading
+
+from datetime import timedelta
+
+import numpy as np
+
+from .optimization import Optimizer
+from .resources import revalidate
+from .utils import datetime_to_str, now
+
+logger = logging.getLogger(__name__)
+
+
+class ForecastSnapshot:
+    def __init__(self, start, end, carbon_intensity, resolution: int = 3600):
+        self.start = start
+        self.end = end
+        self.resolution = resolution
+
+        self.carbon_intensity = carbon_intensity
+        self.carbon_intensity.setflags(write=False)
+
+        # short hash of the window and forecast, to tag responses derived from it
+        h = hashlib.blake2b(digest_size=8)
+        h.update(f"{int(start.timestamp())}-{resolution}".encode("ascii"))
+        h.update(np.ascontiguousarray(carbon_intensity).tobytes())
+        self.digest = h.hexdigest()
+
+    def shift(self, start):
+        """same forecast over a window starting later, padded with its last value
+
+        :param start: start of the new window
+        :type start: datetime
+        :return: shifted snapshot, or None if the windows do not overlap
+        :rtype: ForecastSnapshot
+        """
+        offset = int((start - self.start).total_seconds() // self.resolution)
+
+        if offset < 0 or offset >= len(self.carbon_intensity):
+            return None
+
+        carbon_intensity = np.pad(
+            self.carbon_intensity[offset:], (0, offset), mode="edge"
+        )
+        return ForecastSnapshot(
+            start, self.end + (start - self.start), carbon_intensity, self.resolution
+        )
+
+
+class SnapshotCache:
+    """share the carbon intensity forecast between requests
+
+    The forecast window starts at the current bin (e.g. hour) and spans
+    ``horizon``. The snapshot is built once per window (i.e. once per bin)
+    and reused by every caller until the window moves; RTE data changes are
+    picked up when the next window is built.
+
+    While a snapshot is being built, other callers are served the previous
+    one, shifted to the current window. With :meth:`start_refresher`, the
+    next window's snapshot is built shortly before it starts so that callers
+    do not wait at all.
+    """
+
+    def __init__(
+        self,
+        horizon: timedelta = timedelta(days=2),
+        optimizer=None,
+        resolution: int = 3600,
+    ):
+        """
+        :param horizon: duration of the forecast window, defaults to 2 days
+        :type horizon: timedelta, optional
+        :param optimizer: optimizer, defaults to None (an optimizer with the given resolution)
+        :type optimizer: Optimizer, optional
+        :param resolution: duration of each bin in seconds, which must match the optimizer's, defaults to 3600
+        :type resolution: int, optional
+        """
+        self.horizon = horizon
+        self.resolution = resolution
+        self.optimizer = (
+            Optimizer(resolution=resolution) if optimizer is None else optimizer
+        )
+
+        self.snapshot = None
+        self.next_snapshot = None
+        self.lock = threading.Lock()
+
+        self.refresher = None
+        self.refresher_lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def window(self, at=None):
+        if at is None:
+            at = now()
+
+        at = at.replace(microsecond=0)
+        start = at - timedelta(seconds=int(at.timestamp()) % self.resolution)
+        return start, start + self.horizon
+
+    def get(self, at=None) -> ForecastSnapshot:
+        start, end = self.window(at)
+
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.start == start:
+            return snapshot
+
+        if not self.lock.acquire(blocking=False):
+            stale = None if snapshot is None else snapshot.shift(start)
+
+            if stale is not None:
+                return stale
+
+            self.lock.acquire()
+
+        try:
+            snapshot = self.snapshot
+            if snapshot is None or snapshot.start != start:
+                if self.next_snapshot is not None and self.next_snapshot.start == start:
+                    snapshot = self.next_snapshot
+                else:
+                    snapshot = self.build(start, end)
+
+                self.snapshot = snapshot
+                self.next_snapshot = None
+        finally:
+            self.lock.release()
+
+        return snapshot
+
+    def build(self, start, end) -> ForecastSnapshot:
+        carbon_intensity = self.optimizer.predict_carbon_intensity(
+            datetime_to_str(start), datetime_to_str(end)
+        )
+        return ForecastSnapshot(start, end, carbon_intensity, self.resolution)
+
+    def prefetch(self, start):
+        """build the snapshot of a window from freshly fetched data
+
+        :param start: start of the window
+        :type start: datetime
+        """
+        with revalidate():
+            snapshot = self.build(start, start + self.horizon)
+
+        self.next_snapshot = snapshot
+
+    def start_refresher(self, lead: timedelta = timedelta(minutes=5)):
+        """prefetch each window's snapshot in the background, ``lead`` before it starts"""
+        if self.refresher is not None:
+            return
+
+        with self.refresher_lock:
+            if self.refresher is not None:
+                return
+
+            self.stopped.clear()
+            self.refresher = threading.Thread(
+                target=self.refresh_loop, args=(lead,), daemon=True
+            )
+            self.refresher.start()
+
+    def stop_refresher(self):
+        self.stopped.set()
+
+        with self.refresher_lock:
+            if self.refresher is not None:
+                self.refresher.join()
+                self.refresher = None
+
+    def refresh_loop(self, lead):
+        while not self.stopped.is_set():
+            start, _ = self.window()
+            next_start = start + timedelta(seconds=self.resolution)
+
+            if self.stopped.wait(max((next_start - lead - now()).total_seconds(), 0)):
+                break
+
+            try:
+                self.prefetch(next_start)
+            except Exception:
+                logger.exception("forecast refresh failed")
+
+            self.stopped.wait(max((next_start - now()).total_seconds(), 0))
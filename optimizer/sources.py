@@ -3,11 +3,16 @@ from abc import ABC, abstractmethod
 import numpy as np
 
 from .resources import RTEAPI
+from .unavailability import unavailability_index
+import threading
 import yaml
 
-from os.path import join as opj
+from os import stat
+from os.path import abspath, dirname, join as opj
 
 from .utils import (
+    bin_count,
+    bin_values,
     interp,
     str_to_datetime,
     datetime_to_str,
@@ -21,65 +26,64 @@ from datetime import timedelta
 
 
 class PowerSource(ABC):
-    def __init__(self):
-        self.read_config()
-
-    def read_config(self):
-        name = self.__class__.__name__
+    def __init__(self, config: dict = None):
+        """
+        :param config: properties of the source, defaults to None (read from the source registry)
+        :type config: dict, optional
+        """
+        if config is None:
+            config = source_registry().config()[self.__class__.__name__]
 
-        with open("config/sources.yml", "r") as stream:
-            data = yaml.safe_load(stream)
+        self.configure(config)
 
-        self.carbon_intensity = data[name]["carbon_intensity"]
-        self.marginal_cost = data[name]["marginal_cost"]
+    def configure(self, config: dict):
+        self.carbon_intensity = config["carbon_intensity"]
+        self.marginal_cost = config["marginal_cost"]
 
-        if "installed_capacity" in data[name]:
-            self.installed_capacity = data[name]["installed_capacity"]
+        if "installed_capacity" in config:
+            self.installed_capacity = config["installed_capacity"]
 
-        if "color" in data[name]:
-            self.color = data[name]["color"]
+        if "color" in config:
+            self.color = config["color"]
 
     @abstractmethod
-    def get_availability(self, start, end):
+    def get_availability(self, start, end, resolution: int = 3600):
+        """availability of the source
+
+        :param start: start time
+        :type start: str
+        :param end: end time
+        :type end: str
+        :param resolution: duration of each bin in seconds, defaults to 3600
+        :type resolution: int, optional
+        :return: availability for each bin between start and end
+        :rtype: np.ndarray
+        """
         pass
 
-    def retrieve_unavailabilities(self, production_type, start, end):
-        start_dtime = str_to_datetime(start)
-        end_dtime = str_to_datetime(end)
-        n_bins = int((end_dtime - start_dtime).total_seconds() / 3600)
-
-        api = RTEAPI()
-        res = api.request(
-            f"http://digital.iservices.rte-france.com/open_api/unavailability_additional_information/v4/generation_unavailabilities?status=ACTIVE&date_type=APPLICATION_DATE&start_date={start}&end_date={end}&last_version=true",
-        )
-
-        unvailabilities = res.json()["generation_unavailabilities"]
-
-        units = {}
-
-        for unavailability in unvailabilities:
-            if unavailability["production_type"] not in production_type:
-                continue
-
-            unit = unavailability["unit"]["eic_code"]
-
-            if unit not in units:
-                units[unit] = np.zeros(n_bins)
+    def retrieve_unavailabilities(self, production_type, start, end, resolution=3600):
+        return unavailability_index(start, end, resolution).units(production_type)
 
-            for v in unavailability["values"]:
-                unavail_start_dtime = str_to_datetime(v["start_date"])
-                unavail_end_dtime = str_to_datetime(v["end_date"])
+    def available_capacity(self, production_type, start, end, resolution=3600):
+        """installed capacity minus unit unavailabilities
 
-                t_begin = int(
-                    (unavail_start_dtime - start_dtime).total_seconds() / 3600
-                )
-                t_end = int((unavail_end_dtime - start_dtime).total_seconds() / 3600)
+        :param production_type: Production type (e.g.: NUCLEAR, FOSSIL_GAS, ...)
+        :type production_type: str
+        :param start: start time
+        :type start: str
+        :param end: end time
+        :type end: str
+        :param resolution: duration of each bin in seconds, defaults to 3600
+        :type resolution: int, optional
+        :return: available capacity for each bin between start and end.
+        :rtype: np.ndarray
+        """
+        index = unavailability_index(start, end, resolution)
 
-                units[unit][t_begin:t_end] = np.maximum(
-                    units[unit][t_begin:t_end], v["unavailable_capacity"]
-                )
+        availability = np.full(index.n_bins, float(self.installed_capacity))
+        availability -= index.unavailable_capacity(production_type)
 
-        return units
+        return availability
 
     def prediction_forecast(
         self,
@@ -87,6 +91,7 @@ class PowerSource(ABC):
         start: str = None,
         end: str = None,
         interpolation: int = -1,
+        resolution: int = 3600,
     ):
         """recover RTE prediction forecast
 
@@ -96,14 +101,16 @@ class PowerSource(ABC):
         :type start: str, optional
         :param end: end time, defaults to None
         :type end: str, optional
-        :param interp: interpolation offset, defaults to -1
-        :type interp: int, optional
-        :return: prediction forecast for each hour between start and end.
+        :param interpolation: offset in hours of the values used to fill missing values, or interpolation kind, defaults to -1
+        :type interpolation: int or str, optional
+        :param resolution: duration of each bin in seconds, defaults to 3600
+        :type resolution: int, optional
+        :return: prediction forecast for each bin between start and end.
         :rtype: np.ndarray
         """
         start_dtime = str_to_datetime(start)
         end_dtime = str_to_datetime(end)
-        n_bins = int((end_dtime - start_dtime).total_seconds() / 3600)
+        n_bins = bin_count(start_dtime, end_dtime, resolution)
 
         start_hour = start_dtime.replace(minute=0, second=0)
         start_rq = datetime_to_str(start_hour)
@@ -127,141 +134,86 @@ class PowerSource(ABC):
         data = res.json()
 
         for forecast in data["forecasts"]:
-            t_begin = np.array(
-                [
-                    (str_to_datetime(v["start_date"]) - start_dtime).total_seconds()
-                    / 3600
-                    for v in forecast["values"]
-                ]
-            ).astype(int)
-
-            t_end = np.array(
-                [
-                    (str_to_datetime(v["end_date"]) - start_dtime).total_seconds()
-                    / 3600
-                    for v in forecast["values"]
-                ]
-            ).astype(int)
-
-            values = np.array([v["value"] for v in forecast["values"]])
-
-            for i in range(len(t_begin)):
-                availability[t_begin[i] : t_end[i]] += values[i]
-                data_points[t_begin[i] : t_end[i]] += 1
+            values, points = bin_values(
+                forecast["values"], start_dtime, n_bins, resolution
+            )
+            availability += values
+            data_points += points
 
         availability /= data_points
 
         if isinstance(interpolation, int):
-            for i in range(len(availability)):
-                if np.isnan(availability[i]):
-                    availability[i] = availability[i + interpolation]
+            offset = interpolation * 3600 // resolution
+
+            # in order, so that filled values can be used to fill later ones
+            for i in np.flatnonzero(np.isnan(availability)):
+                availability[i] = availability[i + offset]
 
         availability = interp(availability, kind="linear")
         return availability
 
 
 class WindPower(PowerSource):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, config: dict = None):
+        super().__init__(config)
 
-    def get_availability(self, start, end):
-        return self.prediction_forecast("WIND", start, end, interpolation="linear")
+    def get_availability(self, start, end, resolution: int = 3600):
+        return self.prediction_forecast(
+            "WIND", start, end, interpolation="linear", resolution=resolution
+        )
 
 
 class SolarPower(PowerSource):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, config: dict = None):
+        super().__init__(config)
 
-    def get_availability(self, start, end):
-        return self.prediction_forecast("SOLAR", start, end, interpolation=-24)
+    def get_availability(self, start, end, resolution: int = 3600):
+        return self.prediction_forecast(
+            "SOLAR", start, end, interpolation=-24, resolution=resolution
+        )
 
 
 class NuclearPower(PowerSource):
-    def __init__(self):
-        super().__init__()
-
-    def get_availability(self, start, end):
-        start_dtime = str_to_datetime(start)
-        end_dtime = str_to_datetime(end)
-        n_bins = int((end_dtime - start_dtime).total_seconds() / 3600)
+    def __init__(self, config: dict = None):
+        super().__init__(config)
 
-        availability = [self.installed_capacity] * n_bins
-
-        units_unavailabilities = self.retrieve_unavailabilities("NUCLEAR", start, end)
-
-        for unit in units_unavailabilities:
-            availability -= units_unavailabilities[unit]
-
-        return availability
+    def get_availability(self, start, end, resolution: int = 3600):
+        return self.available_capacity("NUCLEAR", start, end, resolution)
 
 
 class GasPower(PowerSource):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, config: dict = None):
+        super().__init__(config)
 
-    def get_availability(self, start, end):
-        start_dtime = str_to_datetime(start)
-        end_dtime = str_to_datetime(end)
-        n_bins = int((end_dtime - start_dtime).total_seconds() / 3600)
-        availability = [self.installed_capacity] * n_bins
-
-        units_unavailabilities = self.retrieve_unavailabilities(
-            "FOSSIL_GAS", start, end
-        )
-
-        for unit in units_unavailabilities:
-            availability -= units_unavailabilities[unit]
-
-        return availability
+    def get_availability(self, start, end, resolution: int = 3600):
+        return self.available_capacity("FOSSIL_GAS", start, end, resolution)
 
 
 class CoalPower(PowerSource):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, config: dict = None):
+        super().__init__(config)
 
-    def get_availability(self, start, end):
-        start_dtime = str_to_datetime(start)
-        end_dtime = str_to_datetime(end)
-        n_bins = int((end_dtime - start_dtime).total_seconds() / 3600)
-        availability = [self.installed_capacity] * n_bins
-
-        units_unavailabilities = self.retrieve_unavailabilities(
-            "FOSSIL_HARD_COAL", start, end
-        )
-
-        for unit in units_unavailabilities:
-            availability -= units_unavailabilities[unit]
-
-        return availability
+    def get_availability(self, start, end, resolution: int = 3600):
+        return self.available_capacity("FOSSIL_HARD_COAL", start, end, resolution)
 
 
 class BiomassPower(PowerSource):
-    def __init__(self):
-        super().__init__()
-
-    def get_availability(self, start, end):
-        start_dtime = str_to_datetime(start)
-        end_dtime = str_to_datetime(end)
-        n_bins = int((end_dtime - start_dtime).total_seconds() / 3600)
-        availability = [self.installed_capacity] * n_bins
+    def __init__(self, config: dict = None):
+        super().__init__(config)
 
-        units_unavailabilities = self.retrieve_unavailabilities("BIOMASS", start, end)
-
-        for unit in units_unavailabilities:
-            availability -= units_unavailabilities[unit]
-
-        return availability
+    def get_availability(self, start, end, resolution: int = 3600):
+        return self.available_capacity("BIOMASS", start, end, resolution)
 
 
 # should be forced to production at T-1
 class HydroPower(PowerSource):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, config: dict = None):
+        super().__init__(config)
 
-    def get_availability(self, start, end):
+    def get_availability(self, start, end, resolution: int = 3600):
         start_dtime = str_to_datetime(start)
         end_dtime = str_to_datetime(end)
-        n_bins = int((end_dtime - start_dtime).total_seconds() / 3600)
+        n_bins = bin_count(start_dtime, end_dtime, resolution)
 
         availability = np.zeros(n_bins)
         data_points = np.zeros(n_bins)
@@ -283,27 +235,12 @@ class HydroPower(PowerSource):
             if production["production_type"] != "HYDRO_RUN_OF_RIVER_AND_POUNDAGE":
                 continue
 
-            t_begin = np.array(
-                [
-                    (str_to_datetime(v["start_date"]) - start_dtime).total_seconds()
-                    / 3600
-                    for v in production["values"]
-                ]
-            ).astype(int)
-
-            t_end = np.array(
-                [
-                    (str_to_datetime(v["end_date"]) - start_dtime).total_seconds()
-                    / 3600
-                    for v in production["values"]
-                ]
-            ).astype(int)
-
-            values = np.array([v["value"] for v in production["values"]])
-
-            for i in range(len(t_begin)):
-                availability[t_begin[i] : t_end[i]] += values[i]
-                data_points[t_begin[i] : t_end[i]] += 1
+            # production over the past period is mapped onto the requested period
+            values, points = bin_values(
+                production["values"], str_to_datetime(past_start), n_bins, resolution
+            )
+            availability += values
+            data_points += points
 
         availability = availability / data_points
         availability = interp(availability, kind="nearest")
@@ -313,43 +250,105 @@ class HydroPower(PowerSource):
 
 # has opportunity costs due to storage
 class ReservoirHydroPower(PowerSource):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, config: dict = None):
+        super().__init__(config)
 
-    def get_availability(self, start, end):
-        start_dtime = str_to_datetime(start)
-        end_dtime = str_to_datetime(end)
-        n_bins = int((end_dtime - start_dtime).total_seconds() / 3600)
-        availability = [self.installed_capacity] * n_bins
+    def get_availability(self, start, end, resolution: int = 3600):
+        return self.available_capacity("HYDRO_WATER_RESERVOIR", start, end, resolution)
 
-        units_unavailabilities = self.retrieve_unavailabilities(
-            "HYDRO_WATER_RESERVOIR",
-            start,
-            end,
-        )
 
-        for unit in units_unavailabilities:
-            availability -= units_unavailabilities[unit]
+class StoredHydroPower(PowerSource):
+    def __init__(self, config: dict = None):
+        super().__init__(config)
+
+    def get_availability(self, start, end, resolution: int = 3600):
+        return super().get_availability(start, end, resolution)
+
+
+class ImportedPower(PowerSource):
+    def __init__(self, config: dict = None):
+        super().__init__(config)
+
+    def get_availability(self, start, end, resolution: int = 3600):
+        n_bins = bin_count(start, end, resolution)
 
+        availability = np.full(n_bins, float(self.installed_capacity))
         return availability
 
 
-class StoredHydroPower(PowerSource):
-    def __init__(self):
-        super().__init__()
+CONFIG_PATH = opj(dirname(dirname(abspath(__file__))), "config", "sources.yml")
 
-    def get_availability(self, start, end):
-        return super().get_availability(start, end)
+# sources of the optimizer, in dispatch order
+SOURCES = [
+    WindPower,
+    SolarPower,
+    NuclearPower,
+    GasPower,
+    CoalPower,
+    BiomassPower,
+    HydroPower,
+    ReservoirHydroPower,
+    ImportedPower,
+]
 
 
-class ImportedPower(PowerSource):
-    def __init__(self):
-        super().__init__()
+class SourceRegistry:
+    """power sources configured from a sources.yml file
 
-    def get_availability(self, start, end):
-        start_dtime = str_to_datetime(start)
-        end_dtime = str_to_datetime(end)
-        n_bins = int((end_dtime - start_dtime).total_seconds() / 3600)
+    The configuration is parsed once and reloaded when the file is modified,
+    in which case the properties of the sources already built are updated.
+    Each source is built once and shared by every caller.
+    """
 
-        availability = [self.installed_capacity] * n_bins
-        return availability
+    def __init__(self, path: str = CONFIG_PATH):
+        self.path = path
+        self.mtime = None
+        self.data = None
+        self.instances = {}
+        self.lock = threading.RLock()
+
+    def config(self) -> dict:
+        """parsed configuration, reloaded if the file has changed"""
+        mtime = stat(self.path).st_mtime_ns
+
+        with self.lock:
+            if mtime != self.mtime:
+                with open(self.path, "r") as stream:
+                    self.data = yaml.safe_load(stream)
+
+                self.mtime = mtime
+
+                for name, source in self.instances.items():
+                    source.configure(self.data[name])
+
+            return self.data
+
+    def get(self, source_class) -> PowerSource:
+        with self.lock:
+            name = source_class.__name__
+
+            if name not in self.instances:
+                self.instances[name] = source_class(self.config()[name])
+
+            return self.instances[name]
+
+    def sources(self, source_classes: list = None) -> list:
+        """shared instances of the given sources, defaults to the optimizer's sources"""
+        return [
+            self.get(source_class)
+            for source_class in (SOURCES if source_classes is None else source_classes)
+        ]
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def source_registry() -> SourceRegistry:
+    global _registry
+
+    with _registry_lock:
+        if _registry is None:
+            _registry = SourceRegistry()
+
+        return _registry
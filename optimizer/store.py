@@ -0,0 +1,324 @@
+import json
+import re
+
+from datetime import datetime, timedelta
+from os import makedirs, replace
+from os.path import exists, join as opj
+
+import numpy as np
+
+from .utils import bin_intervals, str_to_datetime
+
+
+class HistoryStore:
+    """on-disk store of hourly history arrays
+
+    Each dataset (e.g. production) is a directory holding one .npy array of
+    float64 values per key (e.g. production type), all sharing the same
+    origin and resolution, with NaN for missing values. Arrays are
+    memory-mapped on read, so slicing a time range does not load the rest.
+    """
+
+    def __init__(self, path: str = "data/history", resolution: int = 3600):
+        self.path = path
+        self.resolution = resolution
+
+    @staticmethod
+    def key_filename(key: str) -> str:
+        return re.sub(r"[^A-Za-z0-9_\-]", "_", key)
+
+    @staticmethod
+    def timestamp(t) -> int:
+        if isinstance(t, str):
+            t = str_to_datetime(t)
+
+        if isinstance(t, datetime):
+            return int(t.timestamp())
+
+        return int(t)
+
+    def meta(self, dataset: str) -> dict:
+        meta_file = opj(self.path, dataset, "meta.json")
+
+        if not exists(meta_file):
+            return {
+                "origin": None,
+                "resolution": self.resolution,
+                "keys": {},
+                "coverage": [],
+            }
+
+        with open(meta_file, "r") as fp:
+            meta = json.load(fp)
+
+        # bins of another resolution would be read at the wrong times
+        if meta["resolution"] != self.resolution:
+            raise ValueError(
+                f"{dataset} is stored with a resolution of {meta['resolution']}s, not {self.resolution}s"
+            )
+
+        return meta
+
+    def write_meta(self, dataset: str, meta: dict):
+        meta_file = opj(self.path, dataset, "meta.json")
+
+        with open(meta_file + ".tmp", "w") as fp:
+            json.dump(meta, fp)
+
+        replace(meta_file + ".tmp", meta_file)
+
+    def keys(self, dataset: str) -> list:
+        return list(self.meta(dataset)["keys"])
+
+    def load(self, dataset: str, key: str, meta: dict = None) -> np.ndarray:
+        if meta is None:
+            meta = self.meta(dataset)
+
+        if key not in meta["keys"]:
+            return np.zeros(0)
+
+        return np.load(opj(self.path, dataset, meta["keys"][key]), mmap_mode="r")
+
+    def write(self, dataset: str, key: str, start, values):
+        """write hourly values, keeping stored values where new ones are NaN
+
+        :param dataset: dataset name
+        :type dataset: str
+        :param key: array name
+        :type key: str
+        :param start: time of the first value
+        :type start: datetime, str or int (seconds since epoch)
+        :param values: values
+        :type values: np.ndarray
+        """
+        makedirs(opj(self.path, dataset), exist_ok=True)
+
+        meta = self.meta(dataset)
+        start = self.timestamp(start)
+        values = np.asarray(values, dtype=float)
+
+        # values are stored in bins aligned on the resolution
+        start -= start % self.resolution
+
+        if meta["origin"] is None:
+            meta["origin"] = start
+
+        shift = (meta["origin"] - start) // self.resolution
+        if shift > 0:
+            # move every array of the dataset to the new origin
+            for other in meta["keys"]:
+                stored = np.array(self.load(dataset, other, meta))
+                self.save(
+                    dataset,
+                    meta["keys"][other],
+                    np.concatenate([np.full(shift, np.nan), stored]),
+                )
+
+            meta["origin"] -= shift * self.resolution
+
+        offset = (start - meta["origin"]) // self.resolution
+
+        stored = np.array(self.load(dataset, key, meta))
+
+        if key not in meta["keys"]:
+            meta["keys"][key] = f"{self.key_filename(key)}.npy"
+
+        length = max(len(stored), offset + len(values))
+        array = np.full(length, np.nan)
+        array[: len(stored)] = stored
+
+        current = array[offset : offset + len(values)]
+        array[offset : offset + len(values)] = np.where(
+            np.isnan(values), current, values
+        )
+
+        self.save(dataset, meta["keys"][key], array)
+        self.write_meta(dataset, meta)
+
+    def save(self, dataset: str, filename: str, array: np.ndarray):
+        # readers keep their memory map of the previous file
+        path = opj(self.path, dataset, filename)
+
+        with open(path + ".tmp", "wb") as fp:
+            np.save(fp, array)
+
+        replace(path + ".tmp", path)
+
+    def write_intervals(
+        self, dataset: str, key: str, t_begin, t_end, values, start, end
+    ):
+        """average values over time intervals into hourly bins between start and end and write them
+
+        :param t_begin: start of each interval in seconds since epoch
+        :type t_begin: np.ndarray
+        :param t_end: end of each interval in seconds since epoch
+        :type t_end: np.ndarray
+        :param values: value of each interval
+        :type values: np.ndarray
+        """
+        start_dtime = str_to_datetime(start) if isinstance(start, str) else start
+        end_dtime = str_to_datetime(end) if isinstance(end, str) else end
+        start_dtime -= timedelta(seconds=self.timestamp(start_dtime) % self.resolution)
+        n_bins = int((end_dtime - start_dtime).total_seconds() // self.resolution)
+
+        total, data_points = bin_intervals(
+            t_begin, t_end, values, start_dtime, n_bins, self.resolution
+        )
+
+        with np.errstate(invalid="ignore"):
+            self.write(dataset, key, start_dtime, total / data_points)
+
+    def coverage(self, dataset: str) -> list:
+        """time ranges (in seconds since epoch) that have been retrieved for a dataset"""
+        return [tuple(interval) for interval in self.meta(dataset).get("coverage", [])]
+
+    def cover(self, dataset: str, start, end):
+        """record that a time range has been retrieved for a dataset"""
+        makedirs(opj(self.path, dataset), exist_ok=True)
+
+        meta = self.meta(dataset)
+        intervals = sorted(
+            meta.get("coverage", []) + [[self.timestamp(start), self.timestamp(end)]]
+        )
+
+        merged = []
+        for interval in intervals:
+            if merged and interval[0] <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], interval[1])
+            else:
+                merged.append(list(interval))
+
+        meta["coverage"] = merged
+        self.write_meta(dataset, meta)
+
+    def missing(self, dataset: str, start, end) -> list:
+        """time ranges (in seconds since epoch) between start and end not retrieved yet for a dataset"""
+        t = self.timestamp(start)
+        end = self.timestamp(end)
+
+        gaps = []
+        for covered_start, covered_end in self.coverage(dataset):
+            if covered_end <= t:
+                continue
+
+            if covered_start >= end:
+                break
+
+            if covered_start > t:
+                gaps.append((t, covered_start))
+
+            t = max(t, covered_end)
+
+        if t < end:
+            gaps.append((t, end))
+
+        return gaps
+
+    def last_value_end(self, dataset: str, start, end) -> int:
+        """end (in seconds since epoch) of the last bin between start and end with a value for any key
+
+        :return: end of the last bin with a value, or None if there is none
+        :rtype: int
+        """
+        meta = self.meta(dataset)
+
+        if meta["origin"] is None:
+            return None
+
+        first, last = self.bounds(dataset, meta, start, end)
+
+        last_bin = -1
+        for key in meta["keys"]:
+            values = self.slice(self.load(dataset, key, meta), first, last)
+            valid = np.flatnonzero(~np.isnan(values))
+
+            if len(valid):
+                last_bin = max(last_bin, valid[-1])
+
+        if last_bin < 0:
+            return None
+
+        return meta["origin"] + (first + last_bin + 1) * self.resolution
+
+    def read(self, dataset: str, key: str, start=None, end=None) -> np.ndarray:
+        """read hourly values between start and end (memory-mapped)
+
+        :param dataset: dataset name
+        :type dataset: str
+        :param key: array name
+        :type key: str
+        :param start: start time, defaults to None (first stored value)
+        :type start: datetime, str or int, optional
+        :param end: end time, defaults to None (last stored value)
+        :type end: datetime, str or int, optional
+        :return: values for each hour between start and end, NaN where missing
+        :rtype: np.ndarray
+        """
+        meta = self.meta(dataset)
+
+        if meta["origin"] is None:
+            return np.zeros(0)
+
+        first, last = self.bounds(dataset, meta, start, end)
+        return self.slice(self.load(dataset, key, meta), first, last)
+
+    def bounds(self, dataset: str, meta: dict, start=None, end=None) -> tuple:
+        first = 0
+        if start is not None:
+            first = (self.timestamp(start) - meta["origin"]) // self.resolution
+
+        if end is None:
+            last = max(
+                [len(self.load(dataset, key, meta)) for key in meta["keys"]],
+                default=0,
+            )
+        else:
+            last = (self.timestamp(end) - meta["origin"]) // self.resolution
+
+        return first, last
+
+    @staticmethod
+    def slice(array: np.ndarray, first: int, last: int) -> np.ndarray:
+        if first >= 0 and last <= len(array):
+            return array[first:last]
+
+        # pad the parts of the range that were never stored
+        values = np.full(max(last - first, 0), np.nan)
+        lo, hi = max(first, 0), min(last, len(array))
+        if hi > lo:
+            values[lo - first : hi - first] = array[lo:hi]
+
+        return values
+
+    def times(self, dataset: str, start=None, end=None) -> np.ndarray:
+        """UTC times of the bins returned by :meth:`read`"""
+        meta = self.meta(dataset)
+
+        if meta["origin"] is None:
+            return np.zeros(0, dtype="datetime64[s]")
+
+        first, last = self.bounds(dataset, meta, start, end)
+
+        return np.datetime64(meta["origin"], "s") + np.arange(
+            first, last
+        ) * np.timedelta64(self.resolution, "s")
+
+    def frame(self, dataset: str, start=None, end=None):
+        """dataset as a pandas DataFrame with one column per key, indexed by UTC time"""
+        import pandas as pd
+
+        meta = self.meta(dataset)
+        index = pd.DatetimeIndex(self.times(dataset, start, end), tz="UTC")
+
+        if meta["origin"] is None:
+            return pd.DataFrame(index=index)
+
+        first, last = self.bounds(dataset, meta, start, end)
+
+        return pd.DataFrame(
+            {
+                key: self.slice(self.load(dataset, key, meta), first, last)
+                for key in meta["keys"]
+            },
+            index=index,
+        )
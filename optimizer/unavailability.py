@@ -0,0 +1,272 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .resources import RTEAPI
+from .utils import bin_count, parse_timestamps, str_to_datetime
+
+
+class UnitUnavailabilities:
+    """unavailable capacity of generation units over a time window
+
+    Unavailabilities are kept as intervals (unit, first bin, last bin,
+    capacity) rather than one dense array per unit, which is mostly zeros.
+    Overlapping intervals of a unit are combined with a sweep over their
+    boundaries (taking the maximum capacity), and units are only summed into
+    dense arrays per production type.
+    """
+
+    def __init__(self, start, n_bins: int, resolution: int = 3600):
+        self.start = str_to_datetime(start) if isinstance(start, str) else start
+        self.n_bins = n_bins
+        self.resolution = resolution
+
+        self.unit_codes = {}
+        self.unit_production_type = {}
+        self.chunks = []
+
+    def add(self, unit: str, production_type: str, values: list):
+        """add the unavailabilities of a unit
+
+        :param unit: unit code
+        :type unit: str
+        :param production_type: production type of the unit
+        :type production_type: str
+        :param values: unavailabilities, with start_date, end_date and unavailable_capacity
+        :type values: list
+        """
+        code = self.unit_codes.setdefault(unit, len(self.unit_codes))
+        self.unit_production_type[unit] = production_type
+
+        if not values:
+            return
+
+        origin = int(self.start.timestamp())
+
+        t_begin = parse_timestamps([v["start_date"] for v in values]) - origin
+        t_end = parse_timestamps([v["end_date"] for v in values]) - origin
+        capacity = np.fromiter(
+            (v["unavailable_capacity"] for v in values), dtype=float, count=len(values)
+        )
+
+        self.chunks.append(
+            (
+                np.full(len(values), code),
+                np.clip(t_begin // self.resolution, 0, self.n_bins),
+                # partially covered bins are counted, as in bin_intervals
+                np.clip(-(-t_end // self.resolution), 0, self.n_bins),
+                capacity,
+            )
+        )
+
+    def intervals(self) -> tuple:
+        """unit code, first bin, end bin and capacity of every non-empty interval"""
+        if not self.chunks:
+            empty = np.zeros(0, dtype=int)
+            return empty, empty, empty, np.zeros(0)
+
+        unit, t_begin, t_end, capacity = (
+            np.concatenate(column) for column in zip(*self.chunks)
+        )
+        keep = t_end > t_begin
+
+        return unit[keep], t_begin[keep], t_end[keep], capacity[keep]
+
+    def segments(self) -> tuple:
+        """split each unit's time range at interval boundaries
+
+        :return: unit code, first bin, end bin and maximum unavailable capacity of each segment
+        :rtype: tuple
+        """
+        unit, t_begin, t_end, capacity = self.intervals()
+
+        # boundaries of all units on a single axis, sorted by unit then time
+        stride = self.n_bins + 1
+        boundaries = np.unique(
+            np.concatenate([unit * stride + t_begin, unit * stride + t_end])
+        )
+
+        # segments covered by each interval
+        first = np.searchsorted(boundaries, unit * stride + t_begin)
+        last = np.searchsorted(boundaries, unit * stride + t_end)
+        lengths = last - first
+
+        covered = np.repeat(first - np.cumsum(lengths) + lengths, lengths) + np.arange(
+            np.sum(lengths)
+        )
+
+        maximum = np.zeros(len(boundaries))
+        np.maximum.at(maximum, covered, np.repeat(capacity, lengths))
+
+        # a segment ends at the next boundary of the same unit
+        segment_unit = boundaries[:-1] // stride
+        same_unit = segment_unit == boundaries[1:] // stride
+
+        return (
+            segment_unit[same_unit],
+            boundaries[:-1][same_unit] % stride,
+            boundaries[1:][same_unit] % stride,
+            maximum[:-1][same_unit],
+        )
+
+    def unit_capacity(self, unit: str) -> np.ndarray:
+        """unavailable capacity of a unit for each bin"""
+        capacity = np.zeros(self.n_bins)
+
+        if unit not in self.unit_codes:
+            return capacity
+
+        segment_unit, t_begin, t_end, maximum = self.segments()
+        code = self.unit_codes[unit]
+
+        for b, e, c in zip(
+            t_begin[segment_unit == code],
+            t_end[segment_unit == code],
+            maximum[segment_unit == code],
+        ):
+            capacity[b:e] = c
+
+        return capacity
+
+    def units(self, production_type: str) -> list:
+        return [
+            unit
+            for unit, unit_production_type in self.unit_production_type.items()
+            if unit_production_type == production_type
+        ]
+
+    def production_types(self) -> list:
+        return list(dict.fromkeys(self.unit_production_type.values()))
+
+    def unavailable_capacities(self) -> dict:
+        """total unavailable capacity of each production type for each bin
+
+        :return: unavailable capacity for each bin, per production type with units
+        :rtype: dict
+        """
+        production_types = self.production_types()
+        type_codes = {
+            production_type: i for i, production_type in enumerate(production_types)
+        }
+
+        unit_type = np.zeros(len(self.unit_codes), dtype=int)
+        for unit, code in self.unit_codes.items():
+            unit_type[code] = type_codes[self.unit_production_type[unit]]
+
+        segment_unit, t_begin, t_end, maximum = self.segments()
+
+        diff = np.zeros((len(production_types), self.n_bins + 1))
+        np.add.at(diff, (unit_type[segment_unit], t_begin), maximum)
+        np.add.at(diff, (unit_type[segment_unit], t_end), -maximum)
+
+        capacities = np.cumsum(diff, axis=1)[:, :-1]
+
+        return {
+            production_type: capacities[i]
+            for i, production_type in enumerate(production_types)
+        }
+
+
+class UnavailabilityIndex:
+    """generation unavailabilities of every unit over a time window
+
+    The generation_unavailabilities document is requested and parsed once,
+    and units are partitioned by production type.
+    """
+
+    def __init__(self, start, end, unavailabilities, resolution: int = 3600):
+        self.start = start
+        self.end = end
+        self.resolution = resolution
+
+        start_dtime = str_to_datetime(start)
+        self.n_bins = bin_count(start_dtime, str_to_datetime(end), resolution)
+
+        self.unavailabilities = UnitUnavailabilities(
+            start_dtime, self.n_bins, resolution
+        )
+
+        for unavailability in unavailabilities:
+            self.unavailabilities.add(
+                unavailability["unit"]["eic_code"],
+                unavailability["production_type"],
+                unavailability["values"],
+            )
+
+        self.unavailable_capacities = self.unavailabilities.unavailable_capacities()
+
+    @classmethod
+    def retrieve(cls, start, end, resolution: int = 3600):
+        api = RTEAPI()
+        res = api.request(
+            f"http://digital.iservices.rte-france.com/open_api/unavailability_additional_information/v4/generation_unavailabilities?status=ACTIVE&date_type=APPLICATION_DATE&start_date={start}&end_date={end}&last_version=true",
+        )
+
+        return cls(
+            start, end, res.json()["generation_unavailabilities"], resolution
+        )
+
+    def units(self, production_type: str) -> dict:
+        return {
+            unit: self.unavailabilities.unit_capacity(unit)
+            for unit in self.unavailabilities.units(production_type)
+        }
+
+    def unavailable_capacity(self, production_type: str) -> np.ndarray:
+        if production_type not in self.unavailable_capacities:
+            return np.zeros(self.n_bins)
+
+        return self.unavailable_capacities[production_type]
+
+
+_indices = OrderedDict()
+_indices_lock = threading.Lock()
+# locks of the windows being built
+_building = {}
+MAX_INDICES = 4
+
+
+def cached_index(key):
+    with _indices_lock:
+        if key in _indices:
+            _indices.move_to_end(key)
+            return _indices[key]
+
+    return None
+
+
+def unavailability_index(start, end, resolution: int = 3600) -> UnavailabilityIndex:
+    """retrieve the unavailability index for a time window, building it if needed
+
+    Only one thread builds a given window at a time, the others wait for it;
+    windows are built concurrently.
+    """
+    key = (start, end, resolution)
+
+    index = cached_index(key)
+    if index is not None:
+        return index
+
+    with _indices_lock:
+        key_lock = _building.setdefault(key, threading.Lock())
+
+    with key_lock:
+        # another thread may have built the window while we were waiting
+        index = cached_index(key)
+        if index is not None:
+            return index
+
+        try:
+            index = UnavailabilityIndex.retrieve(start, end, resolution)
+
+            with _indices_lock:
+                _indices[key] = index
+
+                while len(_indices) > MAX_INDICES:
+                    _indices.popitem(last=False)
+        finally:
+            with _indices_lock:
+                _building.pop(key, None)
+
+        return index
@@ -2,7 +2,6 @@ from datetime import datetime
 import pytz
 
 import numpy as np
-from scipy.interpolate import interp1d
 
 DATE_FORMAT = "%Y-%m-%dT%H:%M:%S%z"
 
@@ -20,12 +19,182 @@ def datetime_to_str(dt):
     return s
 
 
+def parse_timestamps(dates):
+    """convert RTE dates to seconds since epoch
+
+    :param dates: dates formatted as YYYY-MM-DDTHH:MM:SS+HH:MM
+    :type dates: list
+    :return: seconds since epoch of each date
+    :rtype: np.ndarray
+    """
+    dates = np.asarray(dates, dtype="U25")
+
+    local = dates.astype("U19").astype("datetime64[s]").astype(np.int64)
+
+    chars = dates.view(np.uint32).reshape(len(dates), 25)
+    digits = chars.astype(np.int64) - ord("0")
+
+    offset = (digits[:, 20] * 10 + digits[:, 21]) * 3600 + (
+        digits[:, 23] * 10 + digits[:, 24]
+    ) * 60
+    offset = np.where(
+        chars[:, 19] == ord("+"), offset, np.where(chars[:, 19] == ord("-"), -offset, 0)
+    )
+
+    return local - offset
+
+
+def bin_count(start, end, resolution=3600) -> int:
+    """amount of bins of a given duration (in seconds) between start and end
+
+    :param start: start time
+    :type start: datetime or str
+    :param end: end time
+    :type end: datetime or str
+    :param resolution: duration of each bin in seconds, defaults to 3600
+    :type resolution: int, optional
+    :rtype: int
+    """
+    if isinstance(start, str):
+        start = str_to_datetime(start)
+
+    if isinstance(end, str):
+        end = str_to_datetime(end)
+
+    return int((end - start).total_seconds() // resolution)
+
+
+def resample(values, resolution, new_resolution):
+    """resample values along their last axis from one bin duration to another
+
+    Bins are repeated when the new bins are shorter, and averaged when they
+    are longer (trailing bins that do not fill a new bin are dropped). One
+    duration must be a multiple of the other.
+
+    :param values: values for each bin
+    :type values: np.ndarray
+    :param resolution: duration of the bins in seconds
+    :type resolution: int
+    :param new_resolution: duration of the new bins in seconds
+    :type new_resolution: int
+    :return: values for each new bin
+    :rtype: np.ndarray
+    """
+    values = np.asarray(values, dtype=float)
+
+    if max(resolution, new_resolution) % min(resolution, new_resolution):
+        raise ValueError(
+            f"cannot resample from {resolution}s to {new_resolution}s bins"
+        )
+
+    if new_resolution <= resolution:
+        return np.repeat(values, resolution // new_resolution, axis=-1)
+
+    factor = new_resolution // resolution
+    n_bins = values.shape[-1] // factor
+
+    return (
+        values[..., : n_bins * factor]
+        .reshape(values.shape[:-1] + (n_bins, factor))
+        .mean(axis=-1)
+    )
+
+
+def bin_values(values, start, n_bins, resolution=3600):
+    """accumulate RTE values into time bins
+
+    :param values: RTE values (with start_date, end_date and value)
+    :type values: list
+    :param start: start of the first bin
+    :type start: datetime
+    :param n_bins: amount of bins
+    :type n_bins: int
+    :param resolution: duration of each bin in seconds, defaults to 3600
+    :type resolution: int, optional
+    :return: sum of the values and amount of data points for each bin
+    :rtype: tuple
+    """
+    return bin_intervals(
+        parse_timestamps([v["start_date"] for v in values]),
+        parse_timestamps([v["end_date"] for v in values]),
+        np.array([v["value"] for v in values], dtype=float),
+        start,
+        n_bins,
+        resolution,
+    )
+
+
+def bin_intervals(t_begin, t_end, values, start, n_bins, resolution=3600):
+    """accumulate values over time intervals into time bins
+
+    :param t_begin: start of each interval in seconds since epoch
+    :type t_begin: np.ndarray
+    :param t_end: end of each interval in seconds since epoch
+    :type t_end: np.ndarray
+    :param values: value of each interval
+    :type values: np.ndarray
+    :param start: start of the first bin
+    :type start: datetime
+    :param n_bins: amount of bins
+    :type n_bins: int
+    :param resolution: duration of each bin in seconds, defaults to 3600
+    :type resolution: int, optional
+    :return: sum of the values and amount of data points for each bin
+    :rtype: tuple
+    """
+    origin = int(start.timestamp())
+
+    # an interval counts in every bin it overlaps, even partially, so that
+    # intervals shorter than a bin are kept
+    t_begin = np.clip((t_begin - origin) // resolution, 0, n_bins)
+    t_end = np.clip(-((origin - t_end) // resolution), 0, n_bins)
+
+    keep = t_end > t_begin
+    t_begin = t_begin[keep]
+    t_end = t_end[keep]
+    values = values[keep]
+
+    total = np.zeros(n_bins + 1)
+    np.add.at(total, t_begin, values)
+    np.add.at(total, t_end, -values)
+
+    data_points = np.zeros(n_bins + 1)
+    np.add.at(data_points, t_begin, 1)
+    np.add.at(data_points, t_end, -1)
+
+    return np.cumsum(total)[:-1], np.cumsum(data_points)[:-1]
+
+
 def interp(x, kind="nearest"):
+    """fill NaN values from the nearest known values
+
+    Values before the first (after the last) known value are set to the
+    first (last) known value.
+
+    :param x: values
+    :type x: np.ndarray
+    :param kind: interpolation kind, as in scipy's interp1d, defaults to "nearest"
+    :type kind: str, optional
+    :rtype: np.ndarray
+    """
     idx = np.arange(len(x))
+    known = idx[~np.isnan(x)]
+    values = x[known]
+
+    if kind == "linear":
+        return np.interp(idx, known, values)
+
+    if kind == "nearest":
+        # halfway between two known values, the first one is used (like interp1d)
+        nearest = np.searchsorted((known[1:] + known[:-1]) / 2, idx, side="left")
+        return values[nearest].astype(float)
+
+    from scipy.interpolate import interp1d
+
     f = interp1d(
-        idx[~np.isnan(x)],
-        x[~np.isnan(x)],
-        fill_value=(x[~np.isnan(x)][0], x[~np.isnan(x)][-1]),
+        known,
+        values,
+        fill_value=(values[0], values[-1]),
         kind=kind,
         bounds_error=False,
     )
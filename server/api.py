@@ -1,18 +1,25 @@
-from flask import Flask, request
+from flask import Flask, Response, request, jsonify
 
-from optimizer.optimization import Optimizer
-from optimizer.utils import datetime_to_str
-
-from datetime import datetime, timedelta
-import pytz
-
-import numpy as np
+from server import commands
+from server.commands import forecasts
 
 def create_app(test_config=None):
     # create and configure the app
 
     app = Flask(__name__)
     app.config["DEBUG"] = True
+    app.config["REFRESH_FORECASTS"] = True
+
+    if test_config is not None:
+        app.config.update(test_config)
+
+    # forecasts are prefetched before each hour so that requests never wait;
+    # the refresher is started by the first request served rather than on import
+    if app.config["REFRESH_FORECASTS"]:
+
+        @app.before_request
+        def start_refresher():
+            forecasts.start_refresher()
 
     @app.route("/")
     def index():
@@ -20,52 +27,24 @@ def create_app(test_config=None):
 
     @app.route("/command/")
     def command():
-        if "time" not in request.args:
-            return "missing charge time"
-
-        if "max_time" not in request.args:
-            return "missing max charge time"
-
-        try:
-            time = int(float(request.args["time"]) + 0.5)
-        except:
-            return "time has inappropriate format"
-
-        try:
-            max_time = int(request.args["max_time"])
-        except:
-            return "time has inappropriate format"
-
-        now = datetime.now(pytz.timezone("Europe/Paris")).replace(
-            minute=0, second=0, microsecond=0
+        status, content_type, content, headers = commands.command(
+            forecasts,
+            request.args,
+            request.headers.get("Accept"),
+            request.headers.get("If-None-Match"),
+        )
+        return Response(
+            content, status=status, content_type=content_type, headers=headers
         )
 
-        start = datetime_to_str(now)
-        end = datetime_to_str(now + timedelta(days=2))
-
-        optimizer = Optimizer()
-        command = optimizer.optimize(time, max_time, start=start, end=end)
-
-        output = "".join(map(str, command.astype(int)))
-
-        if "saved_emissions" in request.args:
-            production = optimizer.prediction.dispatch(start, end)
-
-            sources_carbon_intensity = np.array(
-                [source.carbon_intensity for source in optimizer.sources]
-            )
-            carbon_intensity = (sources_carbon_intensity @ production) / production.sum(
-                axis=0
-            )
-
-            emissions = np.dot(carbon_intensity, command)
-            ref_emissions = carbon_intensity[:time].sum()
-
-            emissions_saved = (1 - emissions / ref_emissions) * 100
+    @app.route("/command/batch/", methods=["POST"])
+    def command_batch():
+        queries = request.get_json(silent=True)
 
-            output += f"\n{emissions_saved:.0f}"
+        if not isinstance(queries, list):
+            return "expected a list of requests", 400
 
-        return output
+        return jsonify(commands.command_batch(forecasts, queries))
 
     return app
 
@@ -0,0 +1,169 @@
+"""ASGI variant of the command API
+
+Run with any ASGI server, e.g.: uvicorn server.asgi:app
+
+Requests are handled on the event loop; fetching forecasts from RTE and
+computing commands run in a thread pool, so that slow fetches do not block
+other requests. Identical requests received while one is being computed
+share its result.
+"""
+
+import asyncio
+import json
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from server import commands
+
+
+class CommandApp:
+    def __init__(self, forecasts=None, max_workers: int = 4, refresh: bool = True):
+        """
+        :param forecasts: forecast snapshots, defaults to None (shared with the Flask app)
+        :type forecasts: SnapshotCache, optional
+        :param max_workers: amount of threads fetching forecasts and computing commands, defaults to 4
+        :type max_workers: int, optional
+        :param refresh: prefetch forecasts before each hour, defaults to True
+        :type refresh: bool, optional
+        """
+        self.forecasts = commands.forecasts if forecasts is None else forecasts
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.refresh = refresh
+
+        # requests being computed, by method, path, query and body
+        self.in_flight = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+
+        if scope["type"] != "http":
+            return
+
+        body = b""
+        if scope["method"] == "POST":
+            body = await self.read_body(receive)
+
+        headers = {
+            name.decode("latin-1").lower(): value.decode("latin-1")
+            for name, value in scope["headers"]
+        }
+
+        status, content_type, content, response_headers = await self.handle(
+            scope["method"], scope["path"], scope["query_string"], headers, body
+        )
+
+        response_headers = [
+            (name.lower().encode("latin-1"), value.encode("latin-1"))
+            for name, value in response_headers.items()
+        ]
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", content_type.encode("latin-1")),
+                    (b"content-length", str(len(content)).encode("ascii")),
+                ]
+                + response_headers,
+            }
+        )
+        await send({"type": "http.response.body", "body": content})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+
+            if message["type"] == "lifespan.startup":
+                if self.refresh:
+                    self.forecasts.start_refresher()
+
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self.forecasts.stop_refresher
+                )
+                self.executor.shutdown(wait=False)
+
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def read_body(receive) -> bytes:
+        body = b""
+
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+
+            if not message.get("more_body", False):
+                return body
+
+    async def handle(
+        self, method: str, path: str, query_string: bytes, headers: dict, body: bytes
+    ):
+        """route a request
+
+        :return: status, content type, content and headers of the response
+        :rtype: tuple
+        """
+        text = commands.TEXT_MEDIA_TYPE
+
+        if path == "/" and method == "GET":
+            return 200, text, b"ok", {}
+
+        if path == "/command/" and method == "GET":
+            args = {
+                key: values[0]
+                for key, values in parse_qs(
+                    query_string.decode("latin-1"), keep_blank_values=True
+                ).items()
+            }
+
+            accept = headers.get("accept")
+            if_none_match = headers.get("if-none-match")
+
+            return await self.coalesce(
+                (method, path, query_string, accept, if_none_match),
+                commands.command,
+                self.forecasts,
+                args,
+                accept,
+                if_none_match,
+            )
+
+        if path == "/command/batch/" and method == "POST":
+            try:
+                queries = json.loads(body)
+            except ValueError:
+                queries = None
+
+            if not isinstance(queries, list):
+                return 400, text, b"expected a list of requests", {}
+
+            results = await self.coalesce(
+                (method, path, body), commands.command_batch, self.forecasts, queries
+            )
+            return 200, "application/json", json.dumps(results).encode("utf-8"), {}
+
+        return 404, text, b"not found", {}
+
+    async def coalesce(self, key, func, *args):
+        """run func in the thread pool, sharing its result with identical calls"""
+        future = self.in_flight.get(key)
+
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(
+                self.executor, func, *args
+            )
+            self.in_flight[key] = future
+            future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+
+        # a cancelled request does not cancel the computation for the others
+        return await asyncio.shield(future)
+
+
+app = CommandApp()
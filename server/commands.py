@@ -0,0 +1,283 @@
+from optimizer.optimization import Optimizer
+from optimizer.snapshot import SnapshotCache
+from optimizer.scheduling import schedule_batch
+from optimizer.utils import resample
+
+from datetime import timedelta
+import os
+
+import numpy as np
+import struct
+
+# duration of the forecast bins in seconds, and of the forecast window in hours
+RESOLUTION = int(os.environ.get("FORECAST_RESOLUTION", 3600))
+HORIZON = float(os.environ.get("FORECAST_HORIZON", 48))
+
+# availabilities are fetched concurrently, within RTE rate limits
+forecasts = SnapshotCache(
+    horizon=timedelta(hours=HORIZON),
+    optimizer=Optimizer(max_workers=4, resolution=RESOLUTION),
+    resolution=RESOLUTION,
+)
+
+
+# binary command format, see encode_command
+BINARY_VERSION = 2
+BINARY_MEDIA_TYPE = "application/octet-stream"
+TEXT_MEDIA_TYPE = "text/html; charset=utf-8"
+
+
+def encode_command(
+    command, valid_until: int, resolution: int, saved_emissions=None
+) -> bytes:
+    """pack a command into its binary format
+
+    Format version (1 byte), number of bins (1 byte), end of validity as a
+    UNIX timestamp (4 bytes, big-endian), duration of each bin in seconds
+    (2 bytes, big-endian), one bit per bin with the first bin in the most
+    significant bit (6 bytes for 48 bins) and, if requested, the percentage
+    of emissions saved (1 signed byte).
+
+    :param command: command for each bin (0 or 1)
+    :type command: np.ndarray
+    :param valid_until: time until which the command is valid, in seconds since epoch
+    :type valid_until: int
+    :param resolution: duration of each bin in seconds
+    :type resolution: int
+    :param saved_emissions: percentage of emissions saved, defaults to None (omitted)
+    :type saved_emissions: float, optional
+    :rtype: bytes
+    """
+    command = np.asarray(command) > 0.5
+
+    content = struct.pack(
+        ">BBIH", BINARY_VERSION, len(command), valid_until, resolution
+    )
+    content += np.packbits(command).tobytes()
+
+    if saved_emissions is not None:
+        saved_emissions = int(np.clip(np.round(saved_emissions), -128, 127))
+        content += struct.pack(">b", saved_emissions)
+
+    return content
+
+
+def decode_command(content: bytes) -> dict:
+    """unpack a command from its binary format (see :func:`encode_command`)"""
+    version, n_bins, valid_until, resolution = struct.unpack(">BBIH", content[:8])
+    n_bytes = (n_bins + 7) // 8
+
+    command = np.unpackbits(np.frombuffer(content[8 : 8 + n_bytes], dtype=np.uint8))
+
+    decoded = {
+        "version": version,
+        "valid_until": valid_until,
+        "resolution": resolution,
+        "command": command[:n_bins],
+    }
+
+    if len(content) > 8 + n_bytes:
+        decoded["saved_emissions"] = struct.unpack(">b", content[8 + n_bytes :])[0]
+
+    return decoded
+
+
+def etag_matches(etag: str, if_none_match: str) -> bool:
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+
+        if tag.startswith("W/"):
+            tag = tag[2:]
+
+        if tag == etag or tag == "*":
+            return True
+
+    return False
+
+
+def command(forecasts, args, accept: str = None, if_none_match: str = None) -> tuple:
+    """charge command for the current forecast
+
+    Charge times are in hours. The command has one bin per ``resolution``
+    seconds (by default, the resolution of the forecast) over the next
+    ``horizon`` hours (by default, the whole forecast window).
+
+    The command is returned as a string of 0s and 1s (one per bin), or in
+    the binary format of :func:`encode_command` if requested with
+    ``format=binary`` or an ``Accept: application/octet-stream`` header.
+    Responses carry an ETag derived from the forecast and the arguments, so
+    that clients sending it back in ``If-None-Match`` get a 304 response
+    without the command being computed again.
+
+    :param forecasts: forecast snapshots
+    :type forecasts: SnapshotCache
+    :param args: request arguments (time, max_time and optionally resolution, horizon, saved_emissions and format)
+    :type args: dict
+    :param accept: Accept header, defaults to None
+    :type accept: str, optional
+    :param if_none_match: If-None-Match header, defaults to None
+    :type if_none_match: str, optional
+    :return: status, content type, content and headers of the response
+    :rtype: tuple
+    """
+    if "format" in args:
+        binary = args["format"] == "binary"
+    else:
+        binary = accept is not None and BINARY_MEDIA_TYPE in accept
+
+    def error(message):
+        # text clients expect errors in place of the command
+        status = 400 if binary else 200
+        return status, TEXT_MEDIA_TYPE, message.encode("utf-8"), {}
+
+    if "time" not in args:
+        return error("missing charge time")
+
+    if "max_time" not in args:
+        return error("missing max charge time")
+
+    try:
+        resolution = int(args.get("resolution", forecasts.resolution))
+    except:
+        return error("resolution has inappropriate format")
+
+    if resolution <= 0:
+        return error("resolution has inappropriate format")
+
+    try:
+        horizon = float(args.get("horizon", 0))
+    except:
+        return error("horizon has inappropriate format")
+
+    if horizon < 0:
+        return error("horizon has inappropriate format")
+
+    try:
+        time = int(np.floor(float(args["time"]) * 3600 / resolution + 0.5))
+    except:
+        return error("time has inappropriate format")
+
+    try:
+        max_time = int(float(args["max_time"]) * 3600 / resolution)
+    except:
+        return error("time has inappropriate format")
+
+    snapshot = forecasts.get()
+
+    try:
+        carbon_intensity = resample(
+            snapshot.carbon_intensity, snapshot.resolution, resolution
+        )
+    except ValueError as e:
+        return error(str(e))
+
+    if horizon > 0:
+        carbon_intensity = carbon_intensity[: int(horizon * 3600 / resolution)]
+
+    if time < 0 or time > min(max_time, len(carbon_intensity)):
+        return error("charge time exceeds max charge time")
+
+    if binary and len(carbon_intensity) > 255:
+        return error("too many bins for the binary format")
+
+    if binary and resolution > 65535:
+        return error("resolution too large for the binary format")
+
+    saved_emissions = "saved_emissions" in args
+
+    # the command only depends on the forecast and the arguments
+    etag = '"{}-{}-{}-{}-{}-{}-{}"'.format(
+        snapshot.digest,
+        time,
+        max_time,
+        resolution,
+        len(carbon_intensity),
+        int(saved_emissions),
+        int(binary),
+    )
+    headers = {"ETag": etag, "Vary": "Accept"}
+    content_type = BINARY_MEDIA_TYPE if binary else TEXT_MEDIA_TYPE
+
+    if if_none_match is not None and etag_matches(etag, if_none_match):
+        return 304, content_type, b"", headers
+
+    command = forecasts.optimizer.optimize(
+        time, max_time, carbon_intensity=carbon_intensity
+    )
+
+    emissions_saved = None
+    if saved_emissions:
+        emissions = np.dot(carbon_intensity, command)
+        ref_emissions = carbon_intensity[:time].sum()
+
+        emissions_saved = (1 - emissions / ref_emissions) * 100
+
+    if binary:
+        # commands are valid until the forecast is updated
+        valid_until = int(snapshot.start.timestamp()) + snapshot.resolution
+        content = encode_command(command, valid_until, resolution, emissions_saved)
+        return 200, content_type, content, headers
+
+    output = "".join(map(str, command.astype(int)))
+
+    if saved_emissions:
+        output += f"\n{emissions_saved:.0f}"
+
+    return 200, content_type, output.encode("utf-8"), headers
+
+
+def command_batch(forecasts, queries: list) -> list:
+    """charge commands of several devices for the current forecast
+
+    :param forecasts: forecast snapshots
+    :type forecasts: SnapshotCache
+    :param queries: requests, with device_id, time and max_time
+    :type queries: list
+    :return: device_id and command (or error) for each request
+    :rtype: list
+    """
+    snapshot = forecasts.get()
+    carbon_intensity = snapshot.carbon_intensity
+    n_bins = len(carbon_intensity)
+
+    # charge times are in hours
+    bins_per_hour = 3600 / snapshot.resolution
+
+    results = []
+    valid = []
+    times = []
+    max_times = []
+
+    for rq in queries:
+        result = {"device_id": rq.get("device_id") if isinstance(rq, dict) else None}
+        results.append(result)
+
+        try:
+            time = int(np.floor(float(rq["time"]) * bins_per_hour + 0.5))
+            max_time = int(float(rq["max_time"]) * bins_per_hour)
+        except:
+            result["error"] = "time has inappropriate format"
+            continue
+
+        if time < 0 or time > min(max_time, n_bins):
+            result["error"] = "charge time exceeds max charge time"
+            continue
+
+        valid.append(result)
+        times.append(time)
+        max_times.append(max_time)
+
+    commands = schedule_batch(carbon_intensity, times, max_times)
+
+    if commands is None:
+        commands = [
+            forecasts.optimizer.optimize(
+                time, max_time, carbon_intensity=carbon_intensity
+            )
+            for time, max_time in zip(times, max_times)
+        ]
+
+    for result, command in zip(valid, commands):
+        result["command"] = "".join(map(str, command.astype(int)))
+
+    return results
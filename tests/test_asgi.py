@@ -0,0 +1,217 @@
+import pytest
+
+from optimizer.optimization import Optimizer
+from optimizer.snapshot import SnapshotCache
+from server.asgi import CommandApp
+from server.commands import decode_command, encode_command
+
+import asyncio
+import json
+import threading
+import time
+
+import numpy as np
+
+
+class SlowOptimizer(Optimizer):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def predict_carbon_intensity(self, start=None, end=None, forecast=None):
+        time.sleep(0.1)
+        return np.arange(48, 0, -1, dtype=float)
+
+    def optimize(self, *args, **kwargs):
+        with self.lock:
+            self.calls += 1
+
+        time.sleep(0.1)
+        return super().optimize(*args, **kwargs)
+
+
+def request(app, method, path, query_string=b"", body=b"", headers=()):
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        await app(
+            {
+                "type": "http",
+                "method": method,
+                "path": path,
+                "query_string": query_string,
+                "headers": headers,
+            },
+            receive,
+            send,
+        )
+        return sent[0]["status"], sent[1]["body"], dict(sent[0]["headers"])
+
+    return run()
+
+
+@pytest.fixture
+def app():
+    return CommandApp(SnapshotCache(optimizer=SlowOptimizer()), refresh=False)
+
+
+def test_asgi_command(app):
+    status, body, _ = asyncio.run(
+        request(app, "GET", "/command/", b"time=10&max_time=24&saved_emissions")
+    )
+
+    assert status == 200
+
+    lines = body.decode("ascii").split("\n")
+    assert lines[0] == "0" * 14 + "1" * 10 + "0" * 24
+    assert len(lines[1]) <= 2, "percentage of saved emissions should be returned"
+
+    status, body, _ = asyncio.run(request(app, "GET", "/command/", b"max_time=24"))
+    assert body == b"missing charge time"
+
+
+def test_asgi_command_batch(app):
+    queries = [
+        {"device_id": "a", "time": 10, "max_time": 24},
+        {"device_id": "b", "time": 30, "max_time": 24},
+    ]
+    status, body, _ = asyncio.run(
+        request(app, "POST", "/command/batch/", body=json.dumps(queries).encode())
+    )
+
+    assert status == 200
+
+    data = json.loads(body)
+    assert [result["device_id"] for result in data] == ["a", "b"]
+    assert len(data[0]["command"]) == 48
+    assert "error" in data[1], "infeasible requests must be reported"
+
+    status, _, _ = asyncio.run(request(app, "POST", "/command/batch/", body=b"{}"))
+    assert status == 400
+
+
+def test_asgi_coalesce(app):
+    async def burst():
+        return await asyncio.gather(
+            *[
+                request(app, "GET", "/command/", b"time=10&max_time=24")
+                for _ in range(8)
+            ],
+            request(app, "GET", "/command/", b"time=5&max_time=24"),
+        )
+
+    responses = asyncio.run(burst())
+
+    assert all(status == 200 for status, _, _ in responses)
+    assert len({body for _, body, _ in responses[:8]}) == 1
+    assert (
+        app.forecasts.optimizer.calls == 2
+    ), "identical in-flight requests must be computed once"
+    assert not app.in_flight
+
+
+def test_binary_command(app):
+    status, content, headers = asyncio.run(
+        request(
+            app,
+            "GET",
+            "/command/",
+            b"time=10&max_time=24&saved_emissions",
+            headers=[(b"accept", b"application/octet-stream")],
+        )
+    )
+
+    assert status == 200
+    assert headers[b"content-type"] == b"application/octet-stream"
+    assert len(content) == 1 + 1 + 4 + 2 + 6 + 1
+
+    decoded = decode_command(content)
+    assert decoded["version"] == 2
+    assert decoded["resolution"] == 3600
+    assert list(decoded["command"]) == [0] * 14 + [1] * 10 + [0] * 24
+    assert decoded["valid_until"] == int(app.forecasts.get().start.timestamp()) + 3600
+    assert "saved_emissions" in decoded
+
+    # the client already has the command
+    status, content, _ = asyncio.run(
+        request(
+            app,
+            "GET",
+            "/command/",
+            b"time=10&max_time=24&saved_emissions&format=binary",
+            headers=[(b"if-none-match", headers[b"etag"])],
+        )
+    )
+
+    assert status == 304
+    assert content == b""
+
+    # the text and binary formats have distinct tags
+    status, content, _ = asyncio.run(
+        request(
+            app,
+            "GET",
+            "/command/",
+            b"time=10&max_time=24&saved_emissions",
+            headers=[(b"if-none-match", headers[b"etag"])],
+        )
+    )
+
+    assert status == 200
+    assert content.startswith(b"0" * 14 + b"1" * 10)
+
+
+def test_encode_command():
+    command = np.zeros(48)
+    command[[0, 9, 47]] = 1
+
+    content = encode_command(command, 1700000000, 900)
+
+    assert content[2:6] == (1700000000).to_bytes(4, "big")
+    assert content[6:8] == (900).to_bytes(2, "big")
+    assert content[8:] == bytes([0b10000000, 0b01000000, 0, 0, 0, 0b00000001])
+    assert np.array_equal(decode_command(content)["command"], command)
+
+
+def test_asgi_command_resolution(app):
+    status, body, _ = asyncio.run(
+        request(
+            app,
+            "GET",
+            "/command/",
+            b"time=2&max_time=6&resolution=900&horizon=6",
+        )
+    )
+
+    assert status == 200
+    assert body == b"0" * 16 + b"1" * 8, "commands must have one bin per resolution"
+
+    status, body, _ = asyncio.run(
+        request(app, "GET", "/command/", b"time=2&max_time=6&resolution=1000")
+    )
+    assert body.startswith(b"cannot resample")
+
+
+def test_asgi_command_infeasible(app):
+    for query in [
+        b"time=10&max_time=5",
+        b"time=10&max_time=24&horizon=5",
+        b"time=-1&max_time=24",
+    ]:
+        status, body, _ = asyncio.run(request(app, "GET", "/command/", query))
+
+        assert status == 200
+        assert body == b"charge time exceeds max charge time"
+
+    status, body, _ = asyncio.run(
+        request(app, "GET", "/command/", b"time=10&max_time=24&horizon=x")
+    )
+    assert body == b"horizon has inappropriate format"
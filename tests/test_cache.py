@@ -0,0 +1,152 @@
+import pytest
+
+from optimizer.cache import CachedResponse, ResponseCache
+
+import time
+
+
+def test_cache_roundtrip(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    data = {"values": [{"start_date": "2023-02-02T00:00:00+01:00", "value": 1}]}
+
+    assert cache.get("key") is None
+
+    cache.set("key", data)
+    assert cache.get("key") == data
+
+    reloaded = ResponseCache(str(tmp_path))
+    assert reloaded.get("key") == data, "payloads must persist across processes"
+
+
+def test_cache_expiration(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+
+    cache.set("expired", {"value": 1}, expires=time.time() - 1)
+    cache.set("valid", {"value": 2}, expires=time.time() + 3600)
+
+    assert cache.get("expired") is None
+    assert cache.get("valid") == {"value": 2}
+    assert ResponseCache(str(tmp_path)).get("expired") is None
+
+
+def test_cache_eviction(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=10**9)
+
+    for i in range(4):
+        cache.set(f"key{i}", {"values": list(range(1000))})
+
+    cache.get("key0")
+    size = cache.size()
+
+    cache.max_bytes = size // 2
+    evicted = cache.evict()
+
+    assert evicted == 2, "least recently used entries must be evicted first"
+    assert cache.size() <= cache.max_bytes
+    assert ResponseCache(str(tmp_path)).get("key0") is not None
+    assert ResponseCache(str(tmp_path)).get("key1") is None
+
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 2
+
+
+def test_cache_eviction_interval(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path), max_bytes=10**9)
+    evictions = []
+
+    evict = cache.evict
+    monkeypatch.setattr(cache, "evict", lambda: evictions.append(evict()))
+
+    for i in range(2 * cache.evict_interval):
+        cache.set(f"key{i}", {"value": i})
+
+    # once to estimate its size, then every evict_interval writes
+    assert len(evictions) == 2, "the cache must not be evicted on every write"
+
+    cache.max_bytes = 0
+    cache.set("key", {"value": 0})
+
+    assert len(evictions) == 3, "the cache must be evicted once over budget"
+
+
+def test_cache_hit_read_only(tmp_path):
+    ResponseCache(str(tmp_path)).set("key", {"value": 1})
+
+    cache = ResponseCache(str(tmp_path))
+    assert cache.get("key") == {"value": 1}
+
+    assert not cache.connection().in_transaction
+    assert (
+        cache.connection().total_changes == 0
+    ), "hits must not write to the database"
+    assert "key" in cache.accessed
+
+
+def test_cache_stale(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+
+    cache.set("key", {"value": 1}, expires=time.time() - 1)
+
+    assert cache.get("key") is None
+    assert cache.get("key", stale=True) == {"value": 1}
+
+
+def test_cache_lock(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+
+    with cache.lock("key") as acquired:
+        assert acquired
+
+        with cache.lock("key", blocking=False) as acquired_twice:
+            assert not acquired_twice, "a key can only be refreshed by one worker"
+
+    with cache.lock("key", blocking=False) as acquired:
+        assert acquired
+
+
+def test_cache_not_remembered(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+
+    cache.set("key", {"value": 1}, remember=False)
+
+    assert cache.get("key", remember=False) == {"value": 1}
+    assert not cache.memory, "payloads must not be kept in memory"
+
+
+def test_cache_corrupted(tmp_path):
+    cache = ResponseCache(str(tmp_path), memory_size=0)
+
+    cache.set("key", {"value": 1})
+
+    connection = cache.connection()
+    with connection:
+        connection.execute("UPDATE entries SET payload = ? WHERE key = ?", (b"garbage", "key"))
+
+    assert cache.get("key") is None, "corrupted entries must be treated as misses"
+    assert cache.stats()["entries"] == 0
+
+
+def test_revalidate_once(tmp_path, monkeypatch):
+    from optimizer.resources import Resource, revalidate
+
+    class CountingResource(Resource):
+        fetched = 0
+
+        def fetch(self, resource):
+            CountingResource.fetched += 1
+            return CachedResponse(200, {"value": CountingResource.fetched})
+
+    monkeypatch.setattr(Resource, "cache", ResponseCache(str(tmp_path)))
+    resource = CountingResource()
+
+    resource.request("resource")
+
+    with revalidate():
+        assert resource.request("resource").json() == {"value": 2}
+        # e.g. another worker revalidating the same window
+        assert resource.request("resource").json() == {"value": 2}
+
+    assert (
+        CountingResource.fetched == 2
+    ), "a revalidated payload must not be fetched again"
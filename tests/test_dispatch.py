@@ -14,11 +14,12 @@ from optimizer.sources import (
 )
 
 from optimizer.production import ProductionPrediction
+from optimizer.dispatch import lp_dispatcher, merit_order_dispatch
+from optimizer.forecast import ForecastBundle
 
-from datetime import datetime
+from datetime import datetime, timedelta
 import numpy as np
-
-from matplotlib import pyplot as plt
+import pytz
 
 
 @pytest.fixture(scope="function")
@@ -88,6 +89,8 @@ def test_dispatch(sources, start, end):
         [sources[source].carbon_intensity for source in sources]
     )
 
+    from matplotlib import pyplot as plt
+
     fig, ax = plt.subplots()
 
     t = np.arange(interval_duration)
@@ -116,3 +119,84 @@ def test_dispatch(sources, start, end):
 
     fig.legend(ncol=2)
     fig.savefig("output/production.png", bbox_inches="tight")
+
+
+def test_lp_dispatcher():
+    rng = np.random.default_rng(0)
+    marginal_cost = np.array([0, 0, 10, 80, 90, 1000])
+
+    dispatcher = lp_dispatcher(6, 24)
+    assert lp_dispatcher(6, 24) is dispatcher, "problems must be reused across solves"
+
+    for i in range(3):
+        availability = rng.uniform(0, 20000, size=(6, 24))
+        availability[-1] = 100000
+        consumption = rng.uniform(20000, 60000, size=24)
+
+        production = dispatcher.solve(availability, consumption, marginal_cost)
+
+        assert production.shape == (6, 24)
+        assert np.all(production.sum(axis=0) >= consumption - 1e-3)
+        assert np.all(production <= availability + 1e-3)
+
+
+def test_merit_order_dispatch():
+    rng = np.random.default_rng(0)
+    marginal_cost = np.array([10, 0, 90, 0, 80, 1000])
+
+    availability = rng.uniform(0, 20000, size=(6, 24))
+    availability[-1] = 100000
+    consumption = rng.uniform(20000, 60000, size=24)
+
+    production = merit_order_dispatch(availability, consumption, marginal_cost)
+    reference = lp_dispatcher(6, 24).solve(availability, consumption, marginal_cost)
+
+    assert production.shape == (6, 24)
+    assert np.allclose(production.sum(axis=0), consumption)
+    assert np.all(production >= 0)
+    assert np.all(production <= availability)
+    assert np.isclose(
+        marginal_cost @ production.sum(axis=1),
+        marginal_cost @ reference.sum(axis=1),
+        rtol=1e-6,
+    ), "merit order must reach the linear program optimum"
+
+
+def test_forecast_bundle():
+    rng = np.random.default_rng(0)
+    start = datetime(2023, 3, 15, tzinfo=pytz.UTC)
+
+    availability = rng.uniform(0, 20000, size=(3, 24))
+    availability[-1] = 100000
+
+    forecast = ForecastBundle(
+        start,
+        availability,
+        rng.uniform(20000, 60000, size=24),
+        ["a", "b", "c"],
+        [10, 0, 1000],
+        [10, 20, 500],
+    )
+
+    assert forecast.n_bins == 24
+    assert forecast.end == start + timedelta(days=1)
+    assert forecast.times[1] == np.datetime64("2023-03-15T01:00:00")
+    assert forecast.availability.flags.c_contiguous
+
+    with pytest.raises(ValueError):
+        forecast.availability[0, 0] = 0
+
+    availability[0, 0] = 0
+    assert forecast.availability[0, 0] != 0, "bundles must not alias the caller's arrays"
+
+    with pytest.raises(ValueError):
+        ForecastBundle(
+            start, availability, np.zeros(12), ["a", "b", "c"], [0] * 3, [0] * 3
+        )
+
+    for method in ["merit_order", "lp"]:
+        production = ProductionPrediction([], method=method).dispatch(forecast=forecast)
+        assert np.allclose(production.sum(axis=0), forecast.consumption, rtol=1e-4)
+
+        carbon_intensity = forecast.mix_carbon_intensity(production)
+        assert np.all((carbon_intensity >= 10) & (carbon_intensity <= 500))
@@ -1,12 +1,12 @@
 import pytest
 
 from optimizer.optimization import Optimizer
+from optimizer.scheduling import schedule, schedule_batch
+from optimizer.backtest import backtest
 
 from datetime import datetime
 import numpy as np
 
-from matplotlib import pyplot as plt
-
 
 @pytest.mark.parametrize(
     "start,end,max_time",
@@ -21,7 +21,92 @@ def test_optimize(start, end, max_time):
     optimizer = Optimizer()
     command = optimizer.optimize(min_time=12, max_time=max_time, start=start, end=end)
 
+    from matplotlib import pyplot as plt
+
     fig, ax = plt.subplots()
     t = np.arange(len(command))
     ax.plot(t, command, color="black")
     fig.savefig(f"output/command_{max_time}.png", bbox_inches="tight")
+
+
+@pytest.mark.parametrize(
+    "min_time,max_time",
+    [(0, 12), (1, 1), (5, 12), (12, 24), (24, 48), (48, 48)],
+)
+def test_schedule(min_time, max_time):
+    rng = np.random.default_rng(42)
+    carbon_intensity = rng.integers(20, 100, size=48).astype(float)
+
+    optimizer = Optimizer()
+    command = schedule(carbon_intensity, min_time, max_time)
+    reference = optimizer.solve(carbon_intensity, min_time, max_time)
+
+    assert command.shape == (48,), "command must have one value per bin"
+    assert np.all(np.isin(command, [0, 1])), "command must be 0s or 1s only"
+    assert command[:max_time].sum() == min_time, "command must charge min_time bins"
+    assert np.isclose(
+        carbon_intensity @ command, carbon_intensity @ reference
+    ), "schedule must match the integer program optimum"
+
+
+def test_schedule_unsupported():
+    assert schedule(np.ones(48), 13, 12) is None
+    assert schedule(np.array([1.0, np.nan, 2.0]), 1, 3) is None
+
+
+def test_schedule_batch():
+    rng = np.random.default_rng(42)
+    carbon_intensity = rng.integers(20, 100, size=48).astype(float)
+
+    min_times = np.array([0, 1, 5, 12, 24, 48])
+    max_times = np.array([12, 1, 12, 24, 48, 48])
+
+    commands = schedule_batch(carbon_intensity, min_times, max_times)
+
+    assert commands.shape == (len(min_times), 48)
+
+    for i in range(len(min_times)):
+        assert np.array_equal(
+            commands[i], schedule(carbon_intensity, min_times[i], max_times[i])
+        ), "batch schedule must match individual schedules"
+
+
+def test_backtest():
+    rng = np.random.default_rng(42)
+    carbon_intensity = rng.uniform(20, 100, size=200)
+    carbon_intensity[50:55] = np.nan
+    forecasts = np.array(
+        [np.roll(carbon_intensity, -i)[:48] + rng.normal(0, 10, 48) for i in range(200)]
+    )
+
+    results = backtest(carbon_intensity, [12, 24], [1, 6, 30], forecasts=forecasts)
+
+    assert [(r["max_time"], r["charge_time"]) for r in results] == [
+        (12, 1),
+        (12, 6),
+        (24, 1),
+        (24, 6),
+    ]
+
+    for result in results:
+        max_time = result["max_time"]
+        charge_time = result["charge_time"]
+
+        gains = 0
+        optimum_gains = 0
+        windows = 0
+
+        for i in range(len(carbon_intensity) - max_time + 1):
+            actual = carbon_intensity[i : i + max_time]
+            if np.any(np.isnan(actual)):
+                continue
+
+            baseline = actual[:charge_time].sum()
+            gains += baseline - actual @ schedule(forecasts[i, :max_time], charge_time, max_time)
+            optimum_gains += baseline - actual @ schedule(actual, charge_time, max_time)
+            windows += 1
+
+        assert result["windows"] == windows
+        assert np.isclose(result["gains"], gains)
+        assert np.isclose(result["optimum_gains"], optimum_gains)
+        assert result["ratio"] <= 1
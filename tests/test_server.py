@@ -2,11 +2,12 @@ import pytest
 
 
 from server.api import create_app
+from server.commands import decode_command
 
 
 @pytest.fixture
 def app():
-    app = create_app()
+    app = create_app({"REFRESH_FORECASTS": False})
     return app
 
 
@@ -42,3 +43,59 @@ def test_command_saved_emissions(app):
         [int(byte) in [0, 1] for byte in lines[0]]
     ), "command must be 0s or 1s only"
     assert len(lines[1]) <= 2, "percentage of saved emissions should be returned"
+
+
+def test_command_batch(app):
+    response = app.test_client().post(
+        "/command/batch/",
+        json=[
+            {"device_id": "a", "time": 10, "max_time": 24},
+            {"device_id": "b", "time": 5, "max_time": 48},
+            {"device_id": "c", "time": 30, "max_time": 24},
+        ],
+    )
+
+    assert response.status_code == 200
+
+    data = response.get_json()
+
+    assert [result["device_id"] for result in data] == ["a", "b", "c"]
+
+    for result in data[:2]:
+        assert len(result["command"]) == 48, "command must be 48 bytes long"
+        assert all(
+            [int(byte) in [0, 1] for byte in result["command"]]
+        ), "command must be 0s or 1s only"
+
+    assert "error" in data[2], "infeasible requests must be reported"
+
+
+def test_command_binary(app):
+    client = app.test_client()
+    response = client.get(
+        "/command/?time=10&max_time=24",
+        headers={"Accept": "application/octet-stream"},
+    )
+
+    assert response.status_code == 200
+    assert response.content_type == "application/octet-stream"
+
+    command = decode_command(response.data)["command"]
+    assert len(command) == 48, "command must have 48 hours"
+    assert command.sum() == 10
+
+    response = client.get(
+        "/command/?time=10&max_time=24&format=binary",
+        headers={"If-None-Match": response.headers["ETag"]},
+    )
+
+    assert response.status_code == 304, "unchanged commands must not be sent again"
+
+
+def test_refresher_not_started_on_import():
+    from server import api
+    from server.commands import forecasts
+
+    assert (
+        forecasts.refresher is None
+    ), "importing the app must not start the refresher"
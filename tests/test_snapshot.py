@@ -0,0 +1,109 @@
+import pytest
+
+from optimizer.snapshot import SnapshotCache
+
+from datetime import datetime, timedelta
+import numpy as np
+import pytz
+import time
+
+
+class CountingOptimizer:
+    def __init__(self):
+        self.calls = 0
+
+    def predict_carbon_intensity(self, start, end):
+        self.calls += 1
+        return np.arange(48, dtype=float)
+
+
+def test_snapshot_reused_within_hour():
+    optimizer = CountingOptimizer()
+    forecasts = SnapshotCache(optimizer=optimizer)
+
+    t = datetime(2023, 3, 15, 10, 5, tzinfo=pytz.UTC)
+
+    first = forecasts.get(t)
+    second = forecasts.get(t + timedelta(minutes=30))
+
+    assert first is second, "snapshot must be shared within the same hour"
+    assert optimizer.calls == 1
+    assert first.end - first.start == timedelta(days=2)
+
+    third = forecasts.get(t + timedelta(hours=1))
+    assert third.start == first.start + timedelta(hours=1)
+    assert optimizer.calls == 2, "snapshot must be rebuilt when the window moves"
+
+    with pytest.raises(ValueError):
+        third.carbon_intensity[0] = 0
+
+
+def test_snapshot_shift():
+    forecasts = SnapshotCache(optimizer=CountingOptimizer())
+
+    t = datetime(2023, 3, 15, 10, 0, tzinfo=pytz.UTC)
+    snapshot = forecasts.get(t)
+
+    shifted = snapshot.shift(t + timedelta(hours=2))
+
+    assert shifted.start == t + timedelta(hours=2)
+    assert len(shifted.carbon_intensity) == 48
+    assert np.array_equal(shifted.carbon_intensity[:46], np.arange(2, 48))
+    assert np.all(shifted.carbon_intensity[46:] == 47)
+
+    assert snapshot.shift(t + timedelta(days=2)) is None
+
+
+def test_snapshot_prefetch():
+    optimizer = CountingOptimizer()
+    forecasts = SnapshotCache(optimizer=optimizer)
+
+    t = datetime(2023, 3, 15, 10, 55, tzinfo=pytz.UTC)
+    forecasts.get(t)
+    forecasts.prefetch(datetime(2023, 3, 15, 11, 0, tzinfo=pytz.UTC))
+
+    assert optimizer.calls == 2
+
+    snapshot = forecasts.get(t + timedelta(minutes=10))
+
+    assert snapshot.start == datetime(2023, 3, 15, 11, 0, tzinfo=pytz.UTC)
+    assert optimizer.calls == 2, "prefetched snapshot must be used"
+
+
+def test_snapshot_resolution():
+    optimizer = CountingOptimizer()
+    forecasts = SnapshotCache(
+        horizon=timedelta(hours=12), optimizer=optimizer, resolution=900
+    )
+
+    t = datetime(2023, 3, 15, 10, 20, tzinfo=pytz.UTC)
+    snapshot = forecasts.get(t)
+
+    assert snapshot.start == datetime(2023, 3, 15, 10, 15, tzinfo=pytz.UTC)
+    assert snapshot.end == snapshot.start + timedelta(hours=12)
+
+    assert forecasts.get(t + timedelta(minutes=5)) is snapshot
+    assert forecasts.get(t + timedelta(minutes=10)).start == snapshot.start + timedelta(
+        minutes=15
+    )
+
+    shifted = snapshot.shift(snapshot.start + timedelta(minutes=30))
+    assert np.array_equal(shifted.carbon_intensity[:2], [2, 3])
+
+
+def test_snapshot_refresh_failure(caplog):
+    class FailingOptimizer:
+        def predict_carbon_intensity(self, start, end):
+            raise RuntimeError("unreachable")
+
+    forecasts = SnapshotCache(optimizer=FailingOptimizer())
+
+    # the next window is prefetched right away
+    forecasts.start_refresher(lead=timedelta(hours=1))
+    for _ in range(100):
+        if caplog.records:
+            break
+        time.sleep(0.01)
+    forecasts.stop_refresher()
+
+    assert "forecast refresh failed" in caplog.text, "refresh failures must be logged"
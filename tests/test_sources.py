@@ -12,7 +12,14 @@ from optimizer.sources import (
     ImportedPower,
 )
 
+from optimizer.unavailability import UnavailabilityIndex
+from optimizer.sources import SourceRegistry, source_registry
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import os
+import time
 import numpy as np
 
 
@@ -69,3 +76,128 @@ def test_marginal_cost(sources):
     assert np.all(
         np.diff(marginal_cost) >= 0
     ), "marginal cost must follow merit order " + "<=".join(ascending_merit_order)
+
+
+def test_unavailability_index():
+    def unavailability(production_type, unit, values):
+        return {
+            "production_type": production_type,
+            "unit": {"eic_code": unit},
+            "values": [
+                {"start_date": s, "end_date": e, "unavailable_capacity": c}
+                for s, e, c in values
+            ],
+        }
+
+    index = UnavailabilityIndex(
+        "2023-02-02T00:00:00+01:00",
+        "2023-02-02T04:00:00+01:00",
+        [
+            unavailability(
+                "NUCLEAR",
+                "A",
+                [
+                    ("2023-02-01T22:00:00+01:00", "2023-02-02T02:00:00+01:00", 100),
+                    ("2023-02-02T01:00:00+01:00", "2023-02-02T03:00:00+01:00", 200),
+                    ("2023-02-02T01:00:00+01:00", "2023-02-02T02:00:00+01:00", 50),
+                ],
+            ),
+            unavailability(
+                "NUCLEAR",
+                "B",
+                [("2023-02-02T03:00:00+01:00", "2023-02-03T00:00:00+01:00", 50)],
+            ),
+            unavailability(
+                "FOSSIL_GAS",
+                "C",
+                [("2023-02-02T00:00:00+01:00", "2023-02-02T01:00:00+01:00", 10)],
+            ),
+        ],
+    )
+
+    assert np.array_equal(index.unavailable_capacity("NUCLEAR"), [100, 200, 200, 50])
+    assert np.array_equal(index.unavailable_capacity("FOSSIL_GAS"), [10, 0, 0, 0])
+    assert np.array_equal(index.unavailable_capacity("BIOMASS"), [0, 0, 0, 0])
+    assert set(index.units("NUCLEAR")) == {"A", "B"}
+    assert np.array_equal(index.units("NUCLEAR")["A"], [100, 200, 200, 0])
+
+
+def test_unavailability_partial_bins():
+    index = UnavailabilityIndex(
+        "2023-02-02T00:00:00+01:00",
+        "2023-02-02T02:00:00+01:00",
+        [
+            {
+                "production_type": "NUCLEAR",
+                "unit": {"eic_code": "A"},
+                "values": [
+                    {
+                        "start_date": "2023-02-02T00:00:00+01:00",
+                        "end_date": "2023-02-02T01:30:00+01:00",
+                        "unavailable_capacity": 100,
+                    }
+                ],
+            }
+        ],
+    )
+
+    assert np.array_equal(
+        index.unavailable_capacity("NUCLEAR"), [100, 100]
+    ), "partially covered bins must be counted"
+
+
+def test_unavailability_index_single_flight(monkeypatch):
+    from optimizer import unavailability
+
+    retrieved = []
+
+    def retrieve(start, end, resolution):
+        retrieved.append(start)
+        time.sleep(0.2)
+        return UnavailabilityIndex(start, end, [], resolution)
+
+    monkeypatch.setattr(UnavailabilityIndex, "retrieve", staticmethod(retrieve))
+    monkeypatch.setattr(unavailability, "_indices", OrderedDict())
+
+    starts = ["2023-02-02T00:00:00+01:00"] * 4 + ["2023-02-03T00:00:00+01:00"]
+
+    t0 = time.time()
+    with ThreadPoolExecutor(max_workers=len(starts)) as executor:
+        indices = list(
+            executor.map(
+                lambda start: unavailability.unavailability_index(
+                    start, "2023-02-04T00:00:00+01:00"
+                ),
+                starts,
+            )
+        )
+
+    assert len(retrieved) == 2, "a window must only be built once"
+    assert len({id(index) for index in indices[:4]}) == 1
+    assert time.time() - t0 < 0.35, "distinct windows must be built concurrently"
+
+
+def test_source_registry(tmp_path, monkeypatch):
+    config = tmp_path / "sources.yml"
+    config.write_text(
+        "GasPower:\n  carbon_intensity: 500\n  marginal_cost: 80\n  installed_capacity: 100\n"
+    )
+
+    registry = SourceRegistry(str(config))
+    gas = registry.get(GasPower)
+
+    assert registry.get(GasPower) is gas, "sources must be shared"
+    assert gas.installed_capacity == 100
+
+    config.write_text(
+        "GasPower:\n  carbon_intensity: 500\n  marginal_cost: 80\n  installed_capacity: 200\n"
+    )
+    # the file may be rewritten within the resolution of modification times
+    os.utime(config, ns=(0, 0))
+    registry.config()
+
+    assert gas.installed_capacity == 200, "sources must be updated when the config changes"
+
+    # the default configuration does not depend on the working directory
+    monkeypatch.chdir(tmp_path)
+    assert source_registry().sources()[0] is source_registry().sources()[0]
@@ -0,0 +1,235 @@
+import pytest
+
+from optimizer.history import History, Columns
+from optimizer.cache import CachedResponse
+from optimizer.store import HistoryStore
+from optimizer.utils import str_to_datetime
+
+import numpy as np
+
+
+def test_store_roundtrip(tmp_path):
+    store = HistoryStore(str(tmp_path))
+
+    store.write("production", "NUCLEAR", "2023-03-01T00:00:00+01:00", np.arange(24))
+    store.write("production", "SOLAR", "2023-03-01T12:00:00+01:00", np.ones(24))
+
+    assert set(store.keys("production")) == {"NUCLEAR", "SOLAR"}
+
+    nuclear = store.read(
+        "production", "NUCLEAR", "2023-03-01T10:00:00+01:00", "2023-03-01T14:00:00+01:00"
+    )
+    assert isinstance(nuclear, np.memmap), "stored ranges must be memory-mapped"
+    assert np.array_equal(nuclear, [10, 11, 12, 13])
+
+    solar = store.read("production", "SOLAR")
+    assert len(solar) == 36
+    assert np.all(np.isnan(solar[:12]))
+    assert np.all(solar[12:] == 1)
+
+
+def test_store_unaligned(tmp_path):
+    store = HistoryStore(str(tmp_path))
+
+    store.write("production", "NUCLEAR", "2023-03-01T01:00:00+01:00", [1.0, 2.0])
+    store.write("production", "NUCLEAR", "2023-03-01T00:30:00+01:00", [3.0])
+
+    assert np.array_equal(store.read("production", "NUCLEAR"), [3.0, 1.0, 2.0])
+
+
+def test_store_resolution(tmp_path):
+    HistoryStore(str(tmp_path)).write(
+        "production", "NUCLEAR", "2023-03-01T00:00:00+01:00", np.arange(24)
+    )
+
+    with pytest.raises(ValueError):
+        HistoryStore(str(tmp_path), resolution=900).read("production", "NUCLEAR")
+
+
+def test_store_merge(tmp_path):
+    store = HistoryStore(str(tmp_path))
+
+    store.write("consumption", "consumption", "2023-03-02T00:00:00+01:00", np.ones(24))
+    store.write(
+        "consumption",
+        "consumption",
+        "2023-03-01T12:00:00+01:00",
+        np.concatenate([2 * np.ones(12), np.full(24, np.nan)]),
+    )
+
+    consumption = store.read("consumption", "consumption")
+
+    assert len(consumption) == 36
+    assert np.all(consumption[:12] == 2), "data before the origin must be prepended"
+    assert np.all(consumption[12:] == 1), "NaN values must not overwrite stored values"
+
+    frame = store.frame(
+        "consumption", "2023-03-01T00:00:00+01:00", "2023-03-03T00:00:00+01:00"
+    )
+    assert len(frame) == 48
+    assert frame["consumption"].isna().sum() == 12
+
+
+def test_store_coverage(tmp_path):
+    store = HistoryStore(str(tmp_path))
+
+    day = 86400
+    t0 = store.timestamp("2023-03-01T00:00:00+01:00")
+
+    assert store.missing("production", t0, t0 + 3 * day) == [(t0, t0 + 3 * day)]
+
+    store.cover("production", t0, t0 + day)
+    store.cover("production", t0 + 2 * day, t0 + 3 * day)
+    assert store.missing("production", t0, t0 + 4 * day) == [
+        (t0 + day, t0 + 2 * day),
+        (t0 + 3 * day, t0 + 4 * day),
+    ]
+
+    store.cover("production", t0 + day, t0 + 2 * day)
+    assert store.coverage("production") == [(t0, t0 + 3 * day)]
+    assert store.missing("production", t0, t0 + 3 * day) == []
+
+
+def test_history_sync(tmp_path):
+    class RecordingHistory(History):
+        def __init__(self):
+            super().__init__()
+            self.retrieved = []
+
+        def store(self, store, dataset, start, end):
+            self.retrieved.append((start, end))
+
+    store = HistoryStore(str(tmp_path))
+    history = RecordingHistory()
+
+    history.sync(store, "consumption", "2023-03-01T00:00:00+01:00", "2023-03-08T00:00:00+01:00")
+    history.sync(store, "consumption", "2023-03-01T00:00:00+01:00", "2023-03-09T00:00:00+01:00")
+
+    assert history.retrieved == [
+        ("2023-03-01T00:00:00+01:00", "2023-03-08T00:00:00+01:00"),
+        ("2023-03-08T00:00:00+01:00", "2023-03-09T00:00:00+01:00"),
+    ], "only missing ranges must be retrieved"
+
+
+def test_history_sync_dst(tmp_path):
+    class PagingHistory(History):
+        def __init__(self):
+            super().__init__()
+            self.pages = []
+
+        def store(self, store, dataset, start, end):
+            self.pages += self.urls(
+                "{start}/{end}", str_to_datetime(start), str_to_datetime(end), "1W"
+            )
+
+    store = HistoryStore(str(tmp_path))
+    history = PagingHistory()
+
+    # the gap spans the change to summer time on 2023-03-26
+    history.sync(
+        store, "consumption", "2023-03-20T00:00:00+01:00", "2023-03-30T00:00:00+01:00"
+    )
+
+    assert history.pages[0].startswith("2023-03-20T00:00:00+01:00")
+    assert history.pages[-1].endswith("2023-03-30T00:00:00+01:00")
+    assert store.missing(
+        "consumption", "2023-03-20T00:00:00+01:00", "2023-03-30T00:00:00+01:00"
+    ) == []
+
+
+def test_history_sync_lag(tmp_path, monkeypatch):
+    class LaggingHistory(History):
+        def store(self, store, dataset, start, end):
+            # only the first hour has been published
+            store.write(dataset, "consumption", start, [1.0])
+
+    monkeypatch.setattr(
+        "optimizer.history.now",
+        lambda: str_to_datetime("2023-03-10T04:30:00+01:00"),
+    )
+
+    store = HistoryStore(str(tmp_path))
+    LaggingHistory().sync(
+        store, "consumption", "2023-03-10T00:00:00+01:00", "2023-03-11T00:00:00+01:00"
+    )
+
+    assert store.missing(
+        "consumption", "2023-03-10T00:00:00+01:00", "2023-03-10T04:00:00+01:00"
+    ) == [
+        (
+            HistoryStore.timestamp("2023-03-10T01:00:00+01:00"),
+            HistoryStore.timestamp("2023-03-10T04:00:00+01:00"),
+        )
+    ], "hours without data must be retrieved again"
+
+
+def test_history_store_unavailability(tmp_path):
+    class StubHistory(History):
+        def fetch(self, urls):
+            for _ in urls:
+                yield CachedResponse(
+                    200,
+                    {
+                        "generation_unavailabilities": [
+                            {
+                                "status": "ACTIVE",
+                                "unit": {"eic_code": "UNIT"},
+                                "production_type": "NUCLEAR",
+                                "values": [
+                                    {
+                                        "start_date": "2023-03-01T00:30:00+01:00",
+                                        "end_date": "2023-03-01T01:00:00+01:00",
+                                        "unavailable_capacity": 100,
+                                    }
+                                ],
+                            }
+                        ]
+                    },
+                )
+
+    store = HistoryStore(str(tmp_path), resolution=900)
+    StubHistory().store(
+        store, "unavailability", "2023-03-01T00:00:00+01:00", "2023-03-01T02:00:00+01:00"
+    )
+
+    assert np.array_equal(
+        store.read("unavailability", "NUCLEAR"), [0, 0, 100, 100, 0, 0, 0, 0]
+    ), "unavailabilities must be binned at the resolution of the store"
+
+
+def test_columns():
+    columns = Columns("production_type")
+    columns.append(
+        [
+            {
+                "start_date": "2023-03-01T00:00:00+01:00",
+                "end_date": "2023-03-01T01:00:00+01:00",
+                "value": 10,
+            },
+            {
+                "start_date": "2023-03-01T01:00:00+01:00",
+                "end_date": "2023-03-01T02:00:00+01:00",
+                "value": None,
+            },
+        ],
+        production_type="NUCLEAR",
+    )
+    columns.append(
+        [
+            {
+                "start_date": "2023-03-01T00:00:00+01:00",
+                "end_date": "2023-03-01T01:00:00+01:00",
+                "value": 5,
+            }
+        ],
+        production_type="SOLAR",
+    )
+
+    groups = dict(columns.groups("production_type"))
+    assert set(groups) == {("NUCLEAR",), ("SOLAR",)}
+    assert np.isnan(groups[("NUCLEAR",)]["value"][1])
+    assert groups[("SOLAR",)]["start_date"][0] == 1677625200
+
+    frame = columns.frame()
+    assert list(frame["production_type"]) == ["NUCLEAR", "NUCLEAR", "SOLAR"]
+    assert str(frame["start_date"].dt.tz) == "UTC"
@@ -0,0 +1,95 @@
+import pytest
+
+from optimizer.utils import (
+    bin_count,
+    bin_values,
+    parse_timestamps,
+    resample,
+    str_to_datetime,
+)
+
+import numpy as np
+
+
+def test_parse_timestamps():
+    dates = [
+        "2023-03-15T00:00:00+01:00",
+        "2023-07-15T13:45:00+02:00",
+        "2023-01-01T00:00:00-05:30",
+    ]
+
+    assert np.array_equal(
+        parse_timestamps(dates), [str_to_datetime(d).timestamp() for d in dates]
+    ), "timestamps must match datetime.strptime"
+
+
+def test_bin_values():
+    values = [
+        {
+            "start_date": "2023-03-14T23:00:00+01:00",
+            "end_date": "2023-03-15T01:00:00+01:00",
+            "value": 10,
+        },
+        {
+            "start_date": "2023-03-15T01:00:00+01:00",
+            "end_date": "2023-03-15T02:00:00+01:00",
+            "value": 20,
+        },
+        {
+            "start_date": "2023-03-15T00:00:00+01:00",
+            "end_date": "2023-03-15T03:00:00+01:00",
+            "value": 30,
+        },
+        {
+            "start_date": "2023-03-15T03:00:00+01:00",
+            "end_date": "2023-03-15T05:00:00+01:00",
+            "value": 40,
+        },
+    ]
+
+    total, data_points = bin_values(
+        values, str_to_datetime("2023-03-15T00:00:00+01:00"), 4
+    )
+
+    assert np.array_equal(total, [40, 50, 30, 40])
+    assert np.array_equal(data_points, [2, 2, 1, 1])
+
+
+def test_sub_hourly_bins():
+    start = "2023-03-15T00:00:00+01:00"
+    end = "2023-03-15T02:00:00+01:00"
+
+    assert bin_count(start, end) == 2
+    assert bin_count(start, end, resolution=900) == 8
+
+    values = [
+        {
+            "start_date": "2023-03-15T00:00:00+01:00",
+            "end_date": "2023-03-15T01:00:00+01:00",
+            "value": 4,
+        },
+        {
+            "start_date": "2023-03-15T01:00:00+01:00",
+            "end_date": "2023-03-15T01:15:00+01:00",
+            "value": 8,
+        },
+    ]
+
+    total, data_points = bin_values(values, str_to_datetime(start), 8, 900)
+    assert np.array_equal(total, [4, 4, 4, 4, 8, 0, 0, 0])
+
+    # values shorter than a bin count in the bin that contains them
+    total, data_points = bin_values(values, str_to_datetime(start), 2)
+    assert np.array_equal(total, [4, 8])
+    assert np.array_equal(data_points, [1, 1])
+
+
+def test_resample():
+    values = np.array([[1.0, 3.0, 5.0, 7.0, 9.0]])
+
+    assert np.array_equal(resample(values, 900, 1800), [[2, 6]])
+    assert np.array_equal(resample(values[:, :2], 3600, 1800), [[1, 1, 3, 3]])
+    assert np.array_equal(resample(values, 900, 900), values)
+
+    with pytest.raises(ValueError):
+        resample(values, 900, 1000)